@@ -211,6 +211,7 @@ class OverridableComponent(vanilla.Group):
             del instance.customParameters[thisKey]
         else:
             instance.customParameters[thisKey] = casted
+        self.effect.invalidate_parameters()
         if self.postChange:
             self.postChange(self)
 
@@ -1,23 +1,33 @@
 from logging import getLogger
+import pickle
 import sys
-from typing import List, Optional
+import time
+from typing import Iterator, List, Optional, Set, Tuple
 
+from pendot.cache import LayerCache
 from pendot.constants import KEY, PREVIEW_MASTER_NAME, QUICK_PREVIEW_LAYER_NAME
-from pendot.effect import Effect
-from pendot.effect.startdot import StartDot
-from pendot.effect.copy import Copy
-from pendot.effect.dotter import Dotter
-from pendot.effect.guidelines import Guidelines
-from pendot.effect.stroker import Stroker
-from pendot.glyphsbridge import GSFont, GSInstance, GSLayer
-from pendot.utils import decomposedPaths
-
-try:
-    import tqdm
-
-    progress = tqdm.tqdm
-except ImportError:
-    progress = list
+from pendot.effect import Effect, effect_class
+from pendot.fontindex import FontIndex
+from pendot.geometry import (
+    DecomposedGeometry,
+    Geometry,
+    PackedShapes,
+    pack_shapes,
+    unpack_shapes,
+)
+from pendot.glyphsbridge import GSFont, GSInstance, GSLayer, GSShape
+from pendot.incremental import Incremental
+from pendot.metrics import Metrics, shape_counts
+from pendot.utils import gc_paused
+
+
+def progress(iterable, **kwargs):
+    try:
+        import tqdm
+    except ImportError:
+        return iterable
+    return tqdm.tqdm(iterable, **kwargs)
+
 
 logger = getLogger(__name__)
 
@@ -46,22 +56,100 @@ def create_effects(
         effectlist = [effectlist]
     effects = []
     for name in effectlist:
-        effectmap = {
-            "Copy": Copy,
-            "Stroker": Stroker,
-            "Dotter": Dotter,
-            "Guidelines": Guidelines,
-            "StartDot": StartDot,
-        }
-        if name not in effectmap:
-            raise ValueError("Unknown effect " + name)
-        effects.append(effectmap[name](font, instance, args, preview))
+        effects.append(effect_class(name)(font, instance, args, preview))
     return effects
 
 
+def decompose_font(
+    font: GSFont,
+    master_ids: Optional[Set[str]] = None,
+    metrics: Optional[Metrics] = None,
+    glyphs: Optional[Set[str]] = None,
+    index: Optional[FontIndex] = None,
+) -> DecomposedGeometry:
+    """Decompose the master layers of the font.
+
+    By default every master of every glyph is decomposed; ``glyphs`` limits
+    this to the named glyphs and the components they use. Glyphs are visited
+    in component order, so each base glyph is decomposed once and reused by
+    the glyphs which refer to it."""
+    if master_ids is None:
+        master_ids = {master.id for master in font.masters}
+    if index is None:
+        index = FontIndex(font)
+    geometry = {}
+    for glyph in index.component_order():
+        if glyphs is not None and glyph.name not in glyphs:
+            continue
+        for master_id in master_ids:
+            for layer in index.layers(glyph.name, master_id):
+                start = time.perf_counter()
+                Geometry.from_layer(layer, geometry, index)
+                if metrics is not None:
+                    metrics.add_decompose_time(layer, time.perf_counter() - start)
+    return geometry
+
+
+def transform_instances(
+    font: GSFont,
+    instances: List[str],
+    args: Optional[dict] = None,
+    workers: Optional[int] = None,
+    cache: Optional[LayerCache] = None,
+) -> Iterator[Tuple[str, GSFont]]:
+    """Transform the font once for each of the named instances.
+
+    The font is decomposed once, and each instance is then transformed on
+    its own copy of the font and its decomposed geometry. Yields the
+    instance name and the transformed copy. The font passed in is not
+    modified.
+    """
+    snapshot = pickle.dumps(
+        (font, decompose_font(font)), protocol=pickle.HIGHEST_PROTOCOL
+    )
+    for name in instances:
+        instance_font, geometry = pickle.loads(snapshot)
+        instance = find_instance(instance_font, name)
+        if instance is None:
+            raise ValueError(f"Couldn't find instance {name}")
+        effects = create_effects(instance_font, instance, args)
+        if not effects:
+            logger.warning(f"No effects found for instance {name}, skipping.")
+            continue
+        transform_font(
+            instance_font,
+            effects,
+            instance,
+            workers=workers,
+            cache=cache,
+            geometry=geometry,
+        )
+        yield name, instance_font
+
+
 def transform_font(
-    font: GSFont, effects: List[Effect], instance: Optional[GSInstance] = None
+    font: GSFont,
+    effects: List[Effect],
+    instance: Optional[GSInstance] = None,
+    workers: Optional[int] = None,
+    cache: Optional[LayerCache] = None,
+    geometry: Optional[DecomposedGeometry] = None,
+    metrics: Optional[Metrics] = None,
+    incremental: Optional[Incremental] = None,
 ):
+    """Apply the effects to the relevant master of every glyph in the font.
+
+    If ``workers`` is greater than one, the layers are transformed in a pool
+    of that many processes; the output is identical to the serial path.
+    If a ``cache`` is given, layers whose geometry and parameters have been
+    seen before are read from it instead of being transformed again.
+    ``geometry`` may supply the already-decomposed layers; otherwise the
+    relevant master is decomposed first. If ``metrics`` is given, it is
+    filled in with timings and statistics for each glyph. If
+    ``incremental`` is given, glyphs whose inputs are unchanged since its
+    previous output are carried over from that output, and only the rest
+    are transformed.
+    """
     results = {}
     font.masters = [m for m in font.masters if m.name != PREVIEW_MASTER_NAME]
     if len(font.masters) > 1:
@@ -85,10 +173,12 @@ def transform_font(
     else:
         relevant_master = font.masters[0]
 
-    for glyph in progress(font.glyphs):
-        relevant_layers = [
-            layer for layer in glyph.layers if layer.layerId == relevant_master.id
-        ]
+    index = FontIndex(font)
+    for effect in effects:
+        effect.index = index
+    todo = []
+    for glyph in font.glyphs:
+        relevant_layers = index.layers(glyph.name, relevant_master.id)
         if not relevant_layers:
             logger.warning(
                 f"Glyph {glyph.name} has no layer for master {relevant_master.name}, skipping."
@@ -100,26 +190,189 @@ def transform_font(
             )
             sys.exit(1)
 
-        for layer in relevant_layers:
-            if layer.layerId == relevant_master.id:
-                results[layer] = transform_layer(layer, effects)
+        todo.extend(relevant_layers)
+
+    if incremental is not None:
+        results.update(incremental.reuse(todo, effects, index))
+        todo = [layer for layer in todo if layer not in results]
+        logger.info(f"Reusing {len(results)} unchanged glyphs")
+    if geometry is None:
+        geometry = decompose_font(
+            font,
+            {relevant_master.id},
+            metrics,
+            {layer.parent.name for layer in todo} if incremental is not None else None,
+            index,
+        )
+    records = [] if metrics is not None else None
+    if workers and workers > 1 and len(todo) > 1:
+        shapelists = transform_layers_parallel(
+            index, effects, todo, workers, cache, geometry, records
+        )
+    else:
+        shapelists = _transform_layers_serial(todo, effects, cache, geometry, records)
+    for layer, shapes in progress(zip(todo, shapelists), total=len(todo)):
+        results[layer] = shapes
+    if metrics is not None:
+        for layer, record in zip(todo, records):
+            metrics.add_layer(layer, record)
     for layer, shapes in results.items():
         if shapes:
             layer.shapes = shapes
+    if cache is not None:
+        cache.prune()
     for effect in effects:
         effect.postprocess_font()
     # Delete preview master
     return font
 
 
-def transform_layer(layer: GSLayer, effects: List[Effect]):
+# Per-process state for the worker pool. The font index and effects are sent once
+# when each worker starts, rather than once per layer.
+_worker_state = {}
+
+
+def _init_worker(
+    index: FontIndex,
+    effects: List[Effect],
+    cache: Optional[LayerCache] = None,
+    geometry: Optional[DecomposedGeometry] = None,
+    record: bool = False,
+):
+    _worker_state["index"] = index
+    _worker_state["effects"] = effects
+    _worker_state["cache"] = cache
+    _worker_state["geometry"] = geometry or {}
+    _worker_state["record"] = record
+
+
+def _transform_layer_in_worker(key):
+    glyphname, layerid = key
+    layer = _worker_state["index"].layer(glyphname, layerid)
+    record = {} if _worker_state["record"] else None
+    shapes, packed = _transform_layer(
+        layer,
+        _worker_state["effects"],
+        _worker_state["cache"],
+        _worker_state["geometry"].get(key),
+        record,
+    )
+    # Packed shapes are far quicker to send back than glyphsLib objects
+    if packed is None:
+        packed = pack_shapes(shapes)
+    return packed, record
+
+
+def _transform_layers_serial(
+    layers: List[GSLayer],
+    effects: List[Effect],
+    cache: Optional[LayerCache],
+    geometry: DecomposedGeometry,
+    records: Optional[List[dict]] = None,
+):
+    for layer in layers:
+        record = {} if records is not None else None
+        shapes = transform_layer(
+            layer,
+            effects,
+            cache,
+            geometry.get((layer.parent.name, layer.layerId)),
+            record,
+        )
+        if records is not None:
+            records.append(record)
+        yield shapes
+
+
+def transform_layers_parallel(
+    index: FontIndex,
+    effects: List[Effect],
+    layers: List[GSLayer],
+    workers: int,
+    cache: Optional[LayerCache] = None,
+    geometry: Optional[DecomposedGeometry] = None,
+    records: Optional[List[dict]] = None,
+):
+    """Transform the given layers in a process pool.
+
+    Yields the new shapes for each layer, in the same order as ``layers``.
+    If ``records`` is given, the metrics record for each layer is appended
+    to it.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = [(layer.parent.name, layer.layerId) for layer in layers]
+    chunksize = max(1, len(keys) // (workers * 4))
+    # The workers send back packed shapes, and this process does little but
+    # rebuild them; pausing the collector until all are built saves it
+    # rescanning the growing set of new nodes again and again.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(index, effects, cache, geometry, records is not None),
+    ) as executor, gc_paused():
+        for packed, record in executor.map(
+            _transform_layer_in_worker, keys, chunksize=chunksize
+        ):
+            if records is not None:
+                records.append(record)
+            yield unpack_shapes(packed)
+
+
+def transform_layer(
+    layer: GSLayer,
+    effects: List[Effect],
+    cache: Optional[LayerCache] = None,
+    geometry: Optional[Geometry] = None,
+    record: Optional[dict] = None,
+):
+    """Apply the effects to a layer, returning its new shapes.
+
+    If a ``record`` dictionary is given, statistics about the layer and
+    each effect's work on it are stored there for the metrics report."""
+    shapes, packed = _transform_layer(layer, effects, cache, geometry, record)
+    return shapes if shapes is not None else unpack_shapes(packed)
+
+
+def _transform_layer(
+    layer: GSLayer,
+    effects: List[Effect],
+    cache: Optional[LayerCache] = None,
+    geometry: Optional[Geometry] = None,
+    record: Optional[dict] = None,
+) -> Tuple[Optional[List[GSShape]], Optional[PackedShapes]]:
+    # Returns the new shapes, their packed form, or both if we have both
+    # to hand, so that callers wanting one do not pay for building the other
     if layer.name == QUICK_PREVIEW_LAYER_NAME or layer.name == PREVIEW_MASTER_NAME:
-        return []
-    paths = decomposedPaths(layer)
+        return [], None
+    if geometry is None:
+        geometry = Geometry.from_layer(layer)
+    if record is not None:
+        record["segments"] = geometry.segment_count()
+        record["effects"] = {}
+    if cache is not None:
+        key = cache.key(layer, geometry, effects)
+        cached = cache.get(key)
+        if cached is not None:
+            if record is not None:
+                record["cached"] = True
+            return None, cached
     results = []
     for effect in effects:
-        newshapes = effect.process_layer_shapes(layer, paths)
+        effect.counters = {}
+        start = time.perf_counter()
+        newshapes = effect.process_layer_shapes(layer, geometry)
         if newshapes is None:
             raise ValueError(f"Effect {effect} did not return shapes")
+        if record is not None:
+            record["effects"][effect.__class__.__name__] = {
+                "time": time.perf_counter() - start,
+                **shape_counts(newshapes),
+                **effect.counters,
+            }
         results += newshapes
-    return results
+    if cache is None:
+        return results, None
+    packed = pack_shapes(results)
+    cache.put(key, packed)
+    return results, packed
@@ -1,10 +1,13 @@
 import argparse
 import json
+import os
 import sys
 
-from glyphsLib import load
-
-from pendot import create_effects, find_instance, transform_font
+from pendot import create_effects, find_instance, transform_font, transform_instances
+from pendot.cache import LayerCache, load_font
+from pendot.glyphspackage import save_font
+from pendot.incremental import Incremental, remove_manifest
+from pendot.metrics import Metrics
 from pendot.effect.dotter import Dotter
 from pendot.effect.guidelines import Guidelines
 from pendot.effect.stroker import Stroker
@@ -68,12 +71,105 @@ def main(args=None):
     stroke_parser.add_argument("--output", "-o", help="Output font file")
     stroke_parser.add_argument("instance", help="Instance name", nargs="?")
 
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Transform several instances of a font, loading it only once",
+    )
+    batch_parser.add_argument(
+        "--instances",
+        nargs="+",
+        default=["all"],
+        help="Names of instances to build, or 'all'",
+    )
+    batch_parser.add_argument(
+        "--output-dir", default=".", help="Directory for output font files"
+    )
+    batch_parser.add_argument(
+        "--prefix",
+        help="Prefix for output file names (default: the input file name)",
+    )
+    batch_parser.add_argument(
+        "--manifest", help="Write a JSON list of the output files to this file"
+    )
+    batch_parser.add_argument("--config", help="JSON configuration as text")
+    batch_parser.add_argument("--config-file", help="JSON configuration file")
+    batch_parser.add_argument("input", help="Input font file")
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="Time Pendot on synthetic fonts of several sizes",
+    )
+    bench_parser.add_argument(
+        "--scales",
+        nargs="+",
+        help="Sizes of font to benchmark (default: all)",
+    )
+    bench_parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        help="Benchmarks to run (default: all)",
+    )
+    bench_parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of times to run each benchmark"
+    )
+    bench_parser.add_argument("--output", "-o", help="Save the results as JSON")
+    bench_parser.add_argument(
+        "--compare", help="Compare the results with a saved JSON baseline"
+    )
+    bench_parser.add_argument(
+        "--threshold",
+        type=float,
+        help="Slowdown, as a fraction of the baseline, which counts as a regression (default: 0.1)",
+    )
+
+    for subparser in [auto_parser, dot_parser, stroke_parser, batch_parser]:
+        subparser.add_argument(
+            "--jobs",
+            "-j",
+            type=int,
+            default=1,
+            help="Number of processes to use when transforming glyphs",
+        )
+        subparser.add_argument(
+            "--cache-dir",
+            help="Directory in which to cache the parsed source and transformed glyphs between runs",
+        )
+
+    for subparser in [auto_parser, dot_parser, stroke_parser]:
+        subparser.add_argument(
+            "--metrics",
+            help="Write a JSON report of per-glyph and per-effect timings to this file",
+        )
+        subparser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only transform glyphs which have changed since the last run, reusing the rest from the existing output file",
+        )
+
     parser.set_default_subparser("auto")
     args = parser.parse_args(args)
     if not args.command:
         parser.print_help()
         exit(1)
-    font = load(args.input)
+    if args.command == "bench":
+        # The benchmarks are only loaded when they are asked for
+        from pendot.bench import suite
+
+        for option, names, known in [
+            ("--scales", args.scales, suite.SCALES),
+            ("--benchmarks", args.benchmarks, suite.BENCHMARKS),
+        ]:
+            for name in names or []:
+                if name not in known:
+                    bench_parser.error(
+                        f"argument {option}: invalid choice: {name!r} (choose from {', '.join(known)})"
+                    )
+        sys.exit(suite.main(args))
+    cache = LayerCache(args.cache_dir) if args.cache_dir else None
+    font = load_font(args.input, cache)
+    if args.command == "batch":
+        batch(font, args, cache)
+        return
     output = args.output or args.input.replace(
         ".glyphs", "-" + args.command + ".glyphs"
     )
@@ -105,11 +201,57 @@ def main(args=None):
         print("Unknown command", args.command)
         sys.exit(1)
 
-    transform_font(font, effects, gsinstance)
-    if output.endswith(".glyphspackage"):
-        output = output.replace(".glyphspackage", ".glyphs")
+    metrics = Metrics() if args.metrics else None
+    incremental = Incremental.load(output) if args.incremental else None
+    transform_font(
+        font,
+        effects,
+        gsinstance,
+        workers=args.jobs,
+        cache=cache,
+        metrics=metrics,
+        incremental=incremental,
+    )
+    if metrics is not None:
+        metrics.save(args.metrics)
     print("Saving to", output)
-    font.save(output)
+    save_font(font, output)
+    if incremental is not None:
+        incremental.save(output)
+    else:
+        remove_manifest(output)
+
+
+def batch(font, args, cache):
+    overrides = {}
+    if args.config:
+        overrides = json.loads(args.config)
+    if args.config_file:
+        with open(args.config_file) as f:
+            overrides = json.load(f)
+    if args.instances == ["all"]:
+        instances = [i.name for i in font.instances]
+    else:
+        instances = args.instances
+    prefix = args.prefix or os.path.splitext(os.path.basename(args.input))[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = []
+    for name, instance_font in transform_instances(
+        font,
+        instances,
+        overrides,
+        workers=args.jobs,
+        cache=cache,
+    ):
+        output = os.path.join(
+            args.output_dir, prefix + "-" + name.replace(" ", "") + ".glyphs"
+        )
+        print("Saving to", output)
+        instance_font.save(output)
+        outputs.append(output)
+    if args.manifest:
+        with open(args.manifest, "w") as f:
+            json.dump(outputs, f, indent=2)
 
 
 if __name__ == "__main__":
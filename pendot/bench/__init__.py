@@ -0,0 +1 @@
+"""Benchmarks for measuring where Pendot spends its time."""
@@ -0,0 +1,80 @@
+"""Time how long Pendot takes to start, from a fresh interpreter.
+
+Usage: python -m pendot.bench.startup [--repeat N]
+
+Each scenario runs in its own Python process, so that nothing is already
+imported. "help" is ``pendot --help``; "import" imports the pendot package;
+each effect scenario imports pendot, creates that effect alone and
+transforms a one-glyph font, which pulls in everything the effect needs.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from pendot.effect import EFFECTS
+
+TRANSFORM = """
+from pendot import create_effects, find_instance, transform_font
+from pendot.bench.synthetic import INSTANCE_NAME, make_font
+font = make_font(glyphs=1)
+instance = find_instance(font, INSTANCE_NAME)
+transform_font(font, create_effects(font, instance, {{"effects": [{name!r}]}}), instance)
+"""
+
+SCENARIOS = {
+    "help": ["-m", "pendot", "--help"],
+    "import": ["-c", "import pendot"],
+    **{name: ["-c", TRANSFORM.format(name=name)] for name in EFFECTS},
+}
+
+
+def time_startup(arguments: List[str], repeat: int = 5) -> float:
+    """Return the best wall time, in seconds, of running Python with the
+    given arguments."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *arguments],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_startup(
+    scenarios: Optional[List[str]] = None, repeat: int = 5
+) -> Dict[str, float]:
+    return {
+        name: time_startup(SCENARIOS[name], repeat)
+        for name in scenarios or SCENARIOS.keys()
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS.keys(),
+        help="Scenarios to time (default: all)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of times to run each scenario"
+    )
+    args = parser.parse_args(args)
+    baseline = time_startup(["-c", "pass"], args.repeat)
+    print(f"{'python':>10}: {baseline * 1000:8.2f}ms")
+    for name, elapsed in bench_startup(args.scenarios, args.repeat).items():
+        print(f"{name:>10}: {elapsed * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare the cost of marshalling Stroker input and output with the stroke.
+
+Usage: python -m pendot.bench.stroker Font.glyphs [--repeat N]
+"""
+
+import argparse
+import time
+
+from glyphsLib import load
+from ufostroker.ufostroker import constant_width_stroke
+
+from pendot import decompose_font
+from pendot.effect.stroker import Stroker, marshal_geometry, paths_from_result
+
+
+def bench_stroker(font, repeat: int = 5) -> dict:
+    """Stroke every master layer of the font, timing each stage.
+
+    Returns the average seconds per run spent converting the geometry
+    into stroker input ("marshal"), in the stroker itself ("stroke") and
+    building GSPaths from its output ("convert")."""
+    geometry = decompose_font(font)
+    stroker = Stroker(font, None)
+    jobs = []
+    for (glyphname, layerid), layer_geometry in geometry.items():
+        if len(layer_geometry):
+            layer = font.glyphs[glyphname].layers[layerid]
+            jobs.append((layer_geometry, stroker.stroke_options(layer)))
+    timings = {"marshal": 0.0, "stroke": 0.0, "convert": 0.0}
+    for _ in range(repeat):
+        for layer_geometry, options in jobs:
+            start = time.perf_counter()
+            contours = marshal_geometry(layer_geometry)
+            marshalled = time.perf_counter()
+            result = constant_width_stroke(contours, **options)
+            stroked = time.perf_counter()
+            paths_from_result(result)
+            converted = time.perf_counter()
+            timings["marshal"] += marshalled - start
+            timings["stroke"] += stroked - marshalled
+            timings["convert"] += converted - stroked
+    return {stage: elapsed / repeat for stage, elapsed in timings.items()}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="Input font file")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of times to stroke the font"
+    )
+    args = parser.parse_args(args)
+    timings = bench_stroker(load(args.input), args.repeat)
+    total = sum(timings.values())
+    for stage, elapsed in timings.items():
+        print(f"{stage:>8}: {elapsed * 1000:8.2f}ms {elapsed / total:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Time the stages of a Pendot run on synthetic fonts of several sizes.
+
+Results are keyed "<benchmark>/<scale>" and hold the best of several runs,
+in seconds. They can be saved as JSON and compared against a saved
+baseline to catch regressions.
+"""
+
+import json
+import pickle
+import time
+from typing import Callable, Dict, List, Optional
+
+from pendot import create_effects, decompose_font, find_instance, transform_font
+from pendot.bench.synthetic import INSTANCE_NAME, make_font
+from pendot.fontindex import FontIndex
+from pendot.utils import decomposedPaths
+
+try:
+    from pendot._version import version as pendot_version
+except ImportError:
+    pendot_version = "unknown"
+
+# Arguments to make_font for each scale
+SCALES = {
+    "small": dict(glyphs=20),
+    "medium": dict(glyphs=100),
+    "large": dict(glyphs=400, contours=4, segments=6),
+}
+
+DEFAULT_THRESHOLD = 0.1
+
+
+def _effect_benchmark(name: str) -> Callable:
+    def setup(font):
+        instance = find_instance(font, INSTANCE_NAME)
+        index = FontIndex(font)
+        geometry = decompose_font(font, index=index)
+        jobs = [
+            (index.layer(glyphname, layerid), layer_geometry)
+            for (glyphname, layerid), layer_geometry in geometry.items()
+        ]
+
+        def run():
+            # A fresh effect each time, so that no repeat is served from
+            # memos filled in by an earlier one
+            (effect,) = create_effects(font, instance, {"effects": [name]})
+            effect.index = index
+            for layer, layer_geometry in jobs:
+                effect.process_layer_shapes(layer, layer_geometry)
+
+        return run
+
+    return setup
+
+
+def _transform_font(font):
+    snapshot = pickle.dumps(font, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def run():
+        copy = pickle.loads(snapshot)
+        instance = find_instance(copy, INSTANCE_NAME)
+        effects = create_effects(
+            copy, instance, {"effects": ["Dotter", "Stroker", "Guidelines"]}
+        )
+        transform_font(copy, effects, instance)
+
+    return run
+
+
+def _decomposed_paths(font):
+    layers = [layer for glyph in font.glyphs for layer in glyph.layers]
+
+    def run():
+        for layer in layers:
+            decomposedPaths(layer)
+
+    return run
+
+
+def _decompose_font(font):
+    return lambda: decompose_font(font)
+
+
+# Each benchmark takes a font and returns the function to be timed
+BENCHMARKS = {
+    "transform_font": _transform_font,
+    "Dotter": _effect_benchmark("Dotter"),
+    "Stroker": _effect_benchmark("Stroker"),
+    "Guidelines": _effect_benchmark("Guidelines"),
+    "decomposedPaths": _decomposed_paths,
+    "decompose_font": _decompose_font,
+}
+
+
+def run_benchmarks(
+    scales: Optional[List[str]] = None,
+    benchmarks: Optional[List[str]] = None,
+    repeat: int = 3,
+) -> Dict[str, float]:
+    results = {}
+    for scale in scales or SCALES.keys():
+        font = make_font(**SCALES[scale])
+        for name in benchmarks or BENCHMARKS.keys():
+            run = BENCHMARKS[name](font)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            results[f"{name}/{scale}"] = best
+    return results
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[str]:
+    """Return the keys of results more than ``threshold`` slower than
+    the baseline."""
+    return [
+        key
+        for key, elapsed in results.items()
+        if key in baseline and elapsed > baseline[key] * (1 + threshold)
+    ]
+
+
+def main(args) -> int:
+    results = run_benchmarks(args.scales, args.benchmarks, args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    threshold = DEFAULT_THRESHOLD if args.threshold is None else args.threshold
+    regressions = compare(results, baseline, threshold)
+    for key, elapsed in results.items():
+        line = f"{key:<28} {elapsed * 1000:10.2f}ms"
+        if key in baseline:
+            line += f" {elapsed / baseline[key]:6.2f}x"
+            if key in regressions:
+                line += " REGRESSION"
+        print(line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"version": pendot_version, "results": results}, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {threshold:.0%}")
+        return 1
+    return 0
@@ -0,0 +1,113 @@
+"""A deterministic generator of synthetic fonts for benchmarking."""
+
+import random
+
+from glyphsLib.classes import (
+    GSComponent,
+    GSFont,
+    GSFontMaster,
+    GSGlyph,
+    GSInstance,
+    GSLayer,
+    GSNode,
+    GSPath,
+)
+
+from pendot.constants import KEY
+
+INSTANCE_NAME = "Bench"
+WIDTH = 600
+# Contours wander within this box, so that they cross each other
+BOX = (50, 550, -50, 550)
+STEP = 120
+
+
+def make_font(
+    glyphs: int = 100,
+    contours: int = 3,
+    segments: int = 4,
+    crossings: float = 0.5,
+    component_depth: int = 1,
+    seed: int = 1,
+) -> GSFont:
+    """Make a single-master font of open "handwriting" contours.
+
+    Each glyph has ``contours`` open contours of ``segments`` lines and
+    curves. ``crossings`` (0 to 1) is the share of contours drawn as long
+    horizontal strokes across the glyph, which cross the other, mostly
+    vertical, contours. With a ``component_depth`` greater than zero, glyphs
+    also refer to the glyph before them as a component, in chains up to that
+    deep. The same arguments always give the same font.
+
+    The font has one instance, named "Bench", with splitPaths and dashed
+    guidelines turned on; its effects are left for the caller to choose.
+    """
+    rnd = random.Random(seed)
+    font = GSFont()
+    font.familyName = "Pendot Bench"
+    master = GSFontMaster()
+    master.name = "Regular"
+    master.ascender = 750
+    master.capHeight = 700
+    master.xHeight = 500
+    master.descender = -200
+    font.masters.append(master)
+
+    instance = GSInstance()
+    instance.name = INSTANCE_NAME
+    instance.customParameters[KEY + ".splitPaths"] = True
+    instance.customParameters[KEY + ".guidelines"] = [
+        {"height": "Descender", "thickness": 10},
+        {"height": 0, "thickness": 20},
+        {"height": "x-Height", "thickness": 5, "dashPattern": [20, 10]},
+    ]
+    font.instances.append(instance)
+
+    for index in range(glyphs):
+        glyph = GSGlyph("glyph%05d" % index)
+        font.glyphs.append(glyph)
+        layer = GSLayer()
+        layer.layerId = master.id
+        layer.associatedMasterId = master.id
+        layer.width = WIDTH
+        glyph.layers.append(layer)
+        for _ in range(contours):
+            layer.shapes.append(_make_contour(rnd, segments, rnd.random() < crossings))
+        if component_depth and index % (component_depth + 1):
+            base = font.glyphs[index - 1].name
+            layer.shapes.append(GSComponent(base, (rnd.randint(-50, 50), 0)))
+    return font
+
+
+def _make_contour(rnd: random.Random, segments: int, horizontal: bool) -> GSPath:
+    left, right, bottom, top = BOX
+    if horizontal:
+        x, y = left, rnd.uniform(bottom, top)
+        dx, dy = (right - left) / segments, 0
+    else:
+        x, y = rnd.uniform(left, right), bottom
+        dx, dy = 0, (top - bottom) / segments
+    path = GSPath()
+    path.closed = False
+    nodes = [GSNode((x, y), "line")]
+    for _ in range(segments):
+        nx = min(max(x + dx + rnd.uniform(-STEP, STEP) / 2, left), right)
+        ny = min(max(y + dy + rnd.uniform(-STEP, STEP) / 2, bottom), top)
+        if rnd.random() < 0.5:
+            nodes.append(GSNode((nx, ny), "line"))
+        else:
+            # Keep the handles near the chord so that curves stay tame
+            for t in (1 / 3, 2 / 3):
+                nodes.append(
+                    GSNode(
+                        (
+                            x + (nx - x) * t + rnd.uniform(-20, 20),
+                            y + (ny - y) * t + rnd.uniform(-20, 20),
+                        ),
+                        "offcurve",
+                    )
+                )
+            nodes.append(GSNode((nx, ny), "curve"))
+        x, y = nx, ny
+    path.nodes = nodes
+    return path
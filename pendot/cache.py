@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import pickle
+from logging import getLogger
+from typing import Any, List, Optional
+
+from pendot.effect import Effect
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSFont, GSLayer
+from pendot.utils import gc_paused
+
+try:
+    from pendot._version import version as pendot_version
+except ImportError:
+    pendot_version = "unknown"
+
+logger = getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+class LayerCache:
+    """A content-addressed on-disk cache of transform_layer results.
+
+    Entries are keyed on the layer's decomposed geometry, the effect classes
+    and their resolved parameters for the layer, and the Pendot version.
+    transform_layer stores its results packed with ``pack_shapes``, which
+    is much quicker to unpickle than glyphsLib objects. Reading an entry marks it as recently used; when the cache grows beyond
+    ``max_size`` bytes, the least recently used entries are removed by
+    ``prune``. Parsed source fonts are kept in the same cache by
+    ``load_font``."""
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, layer: GSLayer, geometry: Geometry, effects: List[Effect]) -> str:
+        description = {
+            "version": pendot_version,
+            "geometry": geometry.fingerprint(),
+            "effects": [effect.cache_key(layer) for effect in effects],
+        }
+        serialized = json.dumps(description, sort_keys=True, default=repr)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".pickle")
+
+    def get(self, key: str) -> Optional[Any]:
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {filename}: {e}")
+            return None
+        os.utime(filename)
+        return value
+
+    def put(self, key: str, value: Any):
+        filename = self._filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Write to a temporary file first so that concurrent workers never
+        # see a half-written entry.
+        tmpname = f"{filename}.{os.getpid()}.tmp"
+        with open(tmpname, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in max_size."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".pickle"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return
+        for _, size, path in sorted(entries):
+            os.remove(path)
+            total -= size
+            if total <= self.max_size:
+                break
+
+
+def font_key(filename: str) -> str:
+    """Hash the contents of a .glyphs file or .glyphspackage directory,
+    together with the glyphsLib version which will parse it."""
+    import glyphsLib
+
+    digest = hashlib.sha256()
+    digest.update(f"font {glyphsLib.__version__}\n".encode("utf-8"))
+    if os.path.isdir(filename):
+        paths = sorted(
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(filename)
+            for name in names
+        )
+    else:
+        paths = [filename]
+    for path in paths:
+        digest.update(os.path.relpath(path, filename).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_font(filename: str, cache: Optional[LayerCache] = None) -> GSFont:
+    """Load a Glyphs source, using the parsed copy in the cache if there is one.
+
+    On a miss the source is parsed with glyphsLib and the resulting GSFont
+    is stored pickled, keyed by ``font_key``; unpickling it on later runs is
+    much faster than parsing the source again."""
+    import glyphsLib
+
+    if cache is None:
+        with gc_paused():
+            return glyphsLib.load(filename)
+    key = font_key(filename)
+    with gc_paused():
+        font = cache.get(key)
+        if font is None:
+            font = glyphsLib.load(filename)
+            cache.put(key, font)
+    return font
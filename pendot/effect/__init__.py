@@ -1,8 +1,28 @@
+import importlib
 import re
-from typing import Optional, List
+from typing import Any, Dict, Optional, Type
 
 from pendot.constants import KEY
-from pendot.glyphsbridge import GSLayer, GSFont, GSInstance, GSShape
+from pendot.fontindex import FontIndex
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSLayer, GSFont, GSGlyph, GSInstance
+
+# Effect classes by name, as (module, class name). An effect's module, and
+# the libraries it needs, are only imported when the effect is first used.
+EFFECTS = {
+    "Copy": ("pendot.effect.copy", "Copy"),
+    "Stroker": ("pendot.effect.stroker", "Stroker"),
+    "Dotter": ("pendot.effect.dotter", "Dotter"),
+    "Guidelines": ("pendot.effect.guidelines", "Guidelines"),
+    "StartDot": ("pendot.effect.startdot", "StartDot"),
+}
+
+
+def effect_class(name: str) -> Type["Effect"]:
+    if name not in EFFECTS:
+        raise ValueError("Unknown effect " + name)
+    module, classname = EFFECTS[name]
+    return getattr(importlib.import_module(module), classname)
 
 
 class Effect:
@@ -23,37 +43,130 @@ class Effect:
         self.instance = instance
         self.overrides = overrides or {}
         self.preview = preview
+        self._resolved = None
+        self._layer_keys = {}
+        self._index = None
+        # Effect-specific statistics for the layer being processed, which
+        # are reported by --metrics
+        self.counters = {}
 
-    def parameter(self, paramname: str, layer: Optional[GSLayer]):
-        # First try inside the layer
-        # print("Getting parameter ", paramname)
+    @property
+    def index(self) -> FontIndex:
+        """The font's lookup tables; transform_font shares one index between
+        all of its effects, otherwise it is built when first needed."""
+        if self._index is None:
+            self._index = FontIndex(self.font)
+        return self._index
+
+    @index.setter
+    def index(self, index: FontIndex):
+        self._index = index
+
+    def resolved_parameters(self) -> Dict[str, Any]:
+        """Return the value of every parameter, ignoring layer overrides.
+
+        The table is built once per instance; call invalidate_parameters
+        if the instance's custom parameters or the overrides change."""
+        if self._resolved is not None:
+            return self._resolved
+        resolved = {}
+        for paramname, param in self.params.items():
+            # First try inside the instance; but here we look in custom parameters
+            if (
+                self.instance
+                and KEY + "." + paramname in self.instance.customParameters
+            ):
+                resolved[paramname] = self.instance.customParameters[
+                    KEY + "." + paramname
+                ]
+            # Then try command line parameters
+            elif self.overrides.get(paramname) is not None:
+                resolved[paramname] = self.overrides[paramname]
+            else:  # Take the default
+                resolved[paramname] = param["default"]
         if self.instance:
-            layer_instance_override = KEY + "." + self.instance.name + "." + paramname
-            if layer and layer_instance_override in layer.userData:
-                # print("Resolved from layer")
-                return layer.userData[layer_instance_override]
-            # Then try inside the instance; but here we look in custom parameters
-            elif KEY + "." + paramname in self.instance.customParameters:
-                # print("Resolved from instance params")
-                return self.instance.customParameters[KEY + "." + paramname]
-        # Then try command line parameters
-        if (
-            self.overrides
-            and paramname in self.overrides
-            and self.overrides[paramname] is not None
-        ):
-            # print("Resolved from command line")
-            return self.overrides[paramname]
-        else:  # Take the default
-            # print("Resolved from default")
-            return self.params[paramname]["default"]
-
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
+            self._layer_keys = {
+                paramname: KEY + "." + self.instance.name + "." + paramname
+                for paramname in self.params
+            }
+        self._resolved = resolved
+        return resolved
+
+    def invalidate_parameters(self):
+        self._resolved = None
+
+    def parameters(self, layer: Optional[GSLayer]) -> Dict[str, Any]:
+        """Return the value of every parameter for the layer.
+
+        Layer overrides are applied on top of the resolved table. The
+        result must not be modified."""
+        resolved = self.resolved_parameters()
+        if layer is None or not self._layer_keys:
+            return resolved
+        userdata = layer.userData
+        overrides = {
+            paramname: userdata[key]
+            for paramname, key in self._layer_keys.items()
+            if key in userdata
+        }
+        if not overrides:
+            return resolved
+        return {**resolved, **overrides}
+
+    def parameter(self, paramname: str, layer: Optional[GSLayer]):
+        resolved = self.resolved_parameters()
+        # Layer overrides take precedence over everything else
+        if layer is not None and self._layer_keys:
+            key = self._layer_keys[paramname]
+            if key in layer.userData:
+                return layer.userData[key]
+        return resolved[paramname]
+
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
         pass
 
     def postprocess_font(self):
         pass
 
+    def component_glyph_layers(self, name: str) -> Dict[str, GSLayer]:
+        """Return an empty layer of the named glyph for each master.
+
+        The glyph and its master layers are created if they don't exist;
+        effects use this to build the glyphs their components refer to."""
+        glyph = self.index.glyphs.get(name)
+        if glyph is None:
+            glyph = GSGlyph(name)
+            self.font.glyphs.append(glyph)
+            self.index.add_glyph(glyph)
+        layers = {}
+        for master in self.font.masters:
+            layer = self.index.layer(name, master.id)
+            if layer is not None:
+                layer.shapes = []
+            else:
+                layer = GSLayer()
+                if hasattr(glyph, "_setupLayer"):
+                    glyph._setupLayer(layer, master.id)
+                else:
+                    layer.layerId = master.id
+                    layer.associatedMasterId = master.id
+                glyph.layers.append(layer)
+                self.index.add_layer(layer)
+            layers[master.id] = layer
+        return layers
+
+    def cache_key(self, layer: GSLayer):
+        # Everything other than the layer geometry which can affect the
+        # output of process_layer_shapes for this layer.
+        return {
+            "effect": self.__class__.__name__,
+            "preview": self.preview,
+            # Without an instance, effects draw shapes rather than
+            # components of glyphs made in postprocess_font
+            "instance": self.instance is not None,
+            "params": self.parameters(layer),
+        }
+
     @property
     def display_params(self):
         return self.params.keys()
@@ -1,8 +1,8 @@
-from typing import List
-
 from pendot.constants import KEY
 from pendot.effect import Effect
-from pendot.glyphsbridge import GSLayer, GSShape
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSLayer
+from pendot.utils import decomposedPaths
 
 
 class Copy(Effect):
@@ -12,7 +12,15 @@ class Copy(Effect):
     def display_name(self):
         return "Copy paths"
 
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
         if layer.parent.userData.get(KEY + ".disableCopy"):
             return []
-        return shapes
+        # Copy the source paths themselves, rather than rebuilding them from
+        # the geometry, so that node names and user data are kept
+        return decomposedPaths(layer)
+
+    def cache_key(self, layer: GSLayer):
+        return {
+            **super().cache_key(layer),
+            "disabled": bool(layer.parent.userData.get(KEY + ".disableCopy")),
+        }
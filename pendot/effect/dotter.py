@@ -1,28 +1,25 @@
-from typing import List, NamedTuple
+import bisect
+import math
+from collections import defaultdict
+from typing import List, NamedTuple, Optional, Union
 
-import kurbopy
-from pendot.constants import KEY
 from pendot.effect import Effect
+from pendot.geometry import (
+    CURVE_CODE,
+    LINE_CODE,
+    OFFCURVE_CODE,
+    Geometry,
+)
 from pendot.glyphsbridge import (
-    CURVE,
-    LINE,
-    OFFCURVE,
     GSComponent,
-    GSGlyph,
     GSLayer,
-    GSNode,
-    GSPath,
-    GSShape,
     Message,
 )
 from pendot.utils import (
     Segment,
     TuplePoint,
     TupleSegment,
-    decomposedPaths,
     distance,
-    kurbo_bounds_intersect,
-    path_to_kurbo,
     seg_to_tuples,
     seg_to_kurbo,
     makeCircle,
@@ -32,10 +29,10 @@ try:
     from fontTools.misc.bezierTools import (
         Intersection,
         linePointAtT,
+        segmentPointAtT,
         segmentSegmentIntersections,
         splitCubicAtT,
     )
-    from fontTools.varLib.models import piecewiseLinearMap
 except ImportError:
     Message("You need to install the fontTools library to run dotter")
 
@@ -48,120 +45,125 @@ class Center(NamedTuple):
         return distance(self.pos, other.pos)
 
 
-def set_locally_forced(node: GSNode) -> None:
-    if KEY not in node.userData:
-        node.userData[KEY] = {}
-    node.userData[KEY]["locally_forced"] = True
-
-
-def clear_locally_forced(node: GSNode) -> None:
-    # print("Clearing force from ", node)
-    if KEY in node.userData and node.userData["KEY"]:
-        if "locally_forced" in node.userData["KEY"]:
-            del node.userData[KEY]["locally_forced"]
-        if not node.userData[KEY]:
-            del node.userData[KEY]
-    # print(node.userData)
-
-
-def is_start_end(node: GSNode) -> bool:
-    return node.index == 0 or node.index == len(node.parent.nodes) - 1
-
-
-def isForced(node: GSNode) -> bool:
-    # if is_start_end(node):
-    #     return True
-    return KEY in node.userData and (
-        node.userData[KEY].get("forced") or node.userData[KEY].get("locally_forced")
-    )
-
-
-def findIntersections(seg1: Segment, seg2: Segment) -> List["Intersection"]:
-    seg1 = seg_to_tuples(seg1)
-    seg2 = seg_to_tuples(seg2)
+def findIntersections(
+    seg1: Union[Segment, TupleSegment], seg2: Union[Segment, TupleSegment]
+) -> List["Intersection"]:
+    if not isinstance(seg1[0], tuple):
+        seg1 = seg_to_tuples(seg1)
+    if not isinstance(seg2[0], tuple):
+        seg2 = seg_to_tuples(seg2)
     try:
         return segmentSegmentIntersections(seg1, seg2)
     except ZeroDivisionError:  # Defend against bad programmer (myself)
         return []
 
 
-def splitSegment(seg: TupleSegment, t: float) -> tuple[TupleSegment, TupleSegment]:
-    if len(seg) == 2:
-        midpoint = linePointAtT(*seg, t)
-        return [seg[0], midpoint], [midpoint, seg[1]]
-    return splitCubicAtT(*seg, t)
-
-
-def splitAtForcedNode(path: GSPath):
-    # Iterator, yields GSPaths
-    new_path = GSPath()
-    if not any(isForced(n) for n in path.nodes):
-        # No forced nodes, return the original path
-        new_path.nodes = [GSNode(n.position, n.type) for n in path.nodes]
-        new_path.closed = path.closed
-        yield new_path
-        return
-    for n in path.nodes:
-        new_path.nodes.append(GSNode(n.position, n.type))
-        if isForced(n):
-            yield new_path
-            new_path = GSPath()
-            new_path.closed = False
-            new_path.nodes.append(GSNode(n.position, n.type))
-    yield new_path
-
-
-def interpolate_lut(t, lut):
-    lengths_map = {x[0]: x[1] for x in lut}
-    xs_map = {x[0]: x[2] for x in lut}
-    ys_map = {x[0]: x[3] for x in lut}
-    return piecewiseLinearMap(t, lengths_map), (
-        piecewiseLinearMap(t, xs_map),
-        piecewiseLinearMap(t, ys_map),
+def splitAtForcedNode(geometry: Geometry, ix: int):
+    # Iterator, yields lists of segments running between forced nodes.
+    # Each piece holds only the contour's own segments; none is given a
+    # closing segment back to its start.
+    segments = geometry.segment_indices(ix)
+    forced = geometry.forced
+    if geometry.closed[ix]:
+        # Start just after a forced node, so that no piece runs through one
+        breaks = [k for k, indices in enumerate(segments) if forced[indices[-1]]]
+        if breaks:
+            first = breaks[0] + 1
+            segments = segments[first:] + segments[:first]
+    piece = []
+    for indices in segments:
+        piece.append([geometry.point(node_ix) for node_ix in indices])
+        if forced[indices[-1]]:
+            yield piece
+            piece = []
+    if piece:
+        yield piece
+
+
+def interpolate_lut(
+    lengths: list[float], xs: list[float], ys: list[float], targets: list[float]
+) -> list[TuplePoint]:
+    """Find the points at each target distance along a sampled path.
+
+    ``lengths`` holds the (non-decreasing) distance along the path of each
+    sample, and ``xs`` and ``ys`` its position."""
+    points = []
+    last = len(lengths) - 1
+    for target in targets:
+        ix = bisect.bisect_right(lengths, target)
+        if ix == 0:
+            points.append((xs[0], ys[0]))
+            continue
+        if ix > last:
+            points.append((xs[last], ys[last]))
+            continue
+        left, right = lengths[ix - 1], lengths[ix]
+        if right == left:
+            points.append((xs[ix], ys[ix]))
+            continue
+        frac = (target - left) / (right - left)
+        points.append(
+            (
+                xs[ix - 1] + frac * (xs[ix] - xs[ix - 1]),
+                ys[ix - 1] + frac * (ys[ix] - ys[ix - 1]),
+            )
+        )
+    return points
+
+
+# Maximum distance between the sampled polyline and the curve
+LUT_TOLERANCE = 0.1
+
+
+def lut_sample_count(seg) -> int:
+    """Number of samples needed to follow a segment within LUT_TOLERANCE."""
+    import kurbopy
+
+    if not isinstance(seg, kurbopy.CubicBez):
+        return 1
+    # Wang's formula: the flattening error of a cubic split into n equal
+    # parameter steps is at most 3/4 * max |second difference| / n^2.
+    pts = [seg.p0, seg.p1, seg.p2, seg.p3]
+    dd = max(
+        math.hypot(a.x - 2 * b.x + c.x, a.y - 2 * b.y + c.y)
+        for a, b, c in zip(pts, pts[1:], pts[2:])
     )
+    return max(1, math.ceil(math.sqrt(0.75 * dd / LUT_TOLERANCE)))
 
 
-def findCenters(path: GSPath, params: dict, centers: list[Center], name: str):
-    segs = [seg_to_kurbo(seg) for seg in path.segments]
+def findCenters(
+    segments: list[TupleSegment], params: dict, centers: list[Center], name: str
+):
+    segs = [seg_to_kurbo(seg) for seg in segments]
 
     if not segs or not segs[0]:
         return
 
     pathstart = segs[0].start()
-    pathend = segs[-1].end()
 
-    LIMIT = 100
-    plen = sum([seg.arclen(0.1) for seg in segs])
-    if plen == 0:
-        return
+    # Walk each segment once, accumulating the length between neighbouring
+    # samples, so building the table is linear in the number of samples.
+    # The table is kept as parallel arrays, sorted by length.
+    lengths = [0]
+    xs = [pathstart.x]
+    ys = [pathstart.y]
     lengthSoFar = 0
-    x_lut = {
-        0: pathstart.x,
-        1: pathend.x,
-    }
-    y_lut = {
-        0: pathstart.y,
-        1: pathend.y,
-    }
-    distance_lut = {
-        0: 0,
-        1: plen,
-    }
-
     for seg in segs:
-        seglen = seg.arclen(0.1)
-        for t in range(1, LIMIT):
-            local_t = t / LIMIT
-            left = seg.subsegment((0, local_t))
-            lengthHere = lengthSoFar + left.arclen(0.1)
-            global_t = lengthHere / plen
-            leftend = left.end()
-            x_lut[global_t] = leftend.x
-            y_lut[global_t] = leftend.y
-            distance_lut[global_t] = lengthHere
-        lengthSoFar += seglen
-
-    inverted_distance_lut = {v: k for k, v in distance_lut.items()}
+        count = lut_sample_count(seg)
+        accuracy = LUT_TOLERANCE / count
+        prev_t = 0
+        for i in range(1, count + 1):
+            local_t = i / count
+            lengthSoFar += seg.subsegment((prev_t, local_t)).arclen(accuracy)
+            pt = seg.eval(local_t)
+            lengths.append(lengthSoFar)
+            xs.append(pt.x)
+            ys.append(pt.y)
+            prev_t = local_t
+
+    plen = lengthSoFar
+    if plen == 0:
+        return
 
     dotsize = params["dotSize"]
     orig_preferred_step = dotsize + params["dotSpacing"]
@@ -181,132 +183,212 @@ def findCenters(path: GSPath, params: dict, centers: list[Center], name: str):
     # print(f"New preferred step is {preferred_step}")
     # print(f"This yields {plen / preferred_step} dots")
 
-    centers.append(Center(pos=[x_lut[0], y_lut[0]], forced=True))
-    centers.append(Center(pos=[x_lut[1], y_lut[1]], forced=True))
+    centers.append(Center(pos=[xs[0], ys[0]], forced=True))
+    centers.append(Center(pos=[xs[-1], ys[-1]], forced=True))
 
+    targets = []
     start = preferred_step  # Ignore first point
-    while start < plen:
-        this_t = piecewiseLinearMap(start, inverted_distance_lut)
-        (x, y) = piecewiseLinearMap(this_t, x_lut), piecewiseLinearMap(this_t, y_lut)
-        centers.append(Center(pos=(x, y), forced=False))
+    # Stop short of the end, which already has a forced center. When the
+    # step has been adjusted to fit the path, the last step lands on the
+    # end itself, and floating point rounding would decide whether an
+    # unforced duplicate is placed there for overlap removal to resolve.
+    while start < plen - LUT_TOLERANCE:
+        targets.append(start)
         start += preferred_step
-
-
-def insertPointInPathUnlessThere(path, pt: TuplePoint):
-    node: GSNode
-    for node in path.nodes:
-        if distance((node.position.x, node.position.y), pt) < 1.0:
-            set_locally_forced(node)
-            return
-    # Find nearest point on nearest segment
-    best = None
-    new_left_right: tuple[TupleSegment, TupleSegment] = None
-    nearest_seg = None
-    insertion_point_index = None
-    kpt = kurbopy.Point(pt[0], pt[1])
-    index = 0
-    for ix, seg in enumerate(path.segments):
-        kseg = seg_to_kurbo(seg)
-        nearest = kseg.nearest(kpt, 0.1)
-        if best is None or nearest.get_distance_sq() < best.get_distance_sq():
-            best = nearest
-            nearest_seg = ix
-            best_t = nearest.get_t()
-            left, right = kseg.subsegment((0, best_t)), kseg.subsegment((best_t, 1))
-            if isinstance(left, kurbopy.CubicBez):
-                new_left_right = [
-                    (p.x, p.y)
-                    for p in [
-                        left.p0,
-                        left.p1,
-                        left.p2,
-                        left.p3,
-                        right.p1,
-                        right.p2,
-                        right.p3,
-                    ]
-                ]
+    for pos in interpolate_lut(lengths, xs, ys, targets):
+        centers.append(Center(pos=pos, forced=False))
+
+
+def insertForcedNodes(
+    geometry: Geometry, ix: int, insertions: dict[int, list[float]]
+) -> tuple[list[TuplePoint], list[int], list[bool], list[bool]]:
+    """Split a contour at many points in a single pass.
+
+    ``insertions`` maps the index of a segment (as returned by
+    Geometry.segment_indices) to the t values at which it should be split.
+    The new on-curve nodes are forced; a point within one unit of an
+    existing node on the segment forces that node instead. Returns the
+    points, types, forced and smooth flags of the new contour."""
+    start = geometry.offsets[ix]
+    end = geometry.offsets[ix + 1]
+    points = geometry.contour_points(ix)
+    types = list(geometry.types[start:end])
+    forced = list(geometry.forced[start:end])
+    smooth = list(geometry.smooth[start:end])
+    segments = [
+        [node_ix - start for node_ix in indices]
+        for indices in geometry.segment_indices(ix)
+    ]
+    drop = set()
+    before = {}
+    tail = []
+    for segix, ts in insertions.items():
+        indices = segments[segix]
+        seg = [points[node_ix] for node_ix in indices]
+        if len(seg) not in (2, 4):
+            continue
+        kept = []
+        last = seg[0]
+        for t in sorted(ts):
+            pt = segmentPointAtT(seg, t)
+            if distance(pt, seg[-1]) < 1.0:
+                forced[indices[-1]] = True
+            elif distance(pt, last) < 1.0:
+                if not kept:
+                    forced[indices[0]] = True
             else:
-                new_left_right = [
-                    (left.start().x, left.start().y),
-                    pt,
-                    (right.end().x, right.end().y),
-                ]
-            insertion_point_index = index
-        index += len(seg) - 1
-    if nearest_seg is None:
-        raise ValueError("Point not on path...")
-    # print("Old path nodes", path.nodes)
-    # print("Splitting path at ", pt, " to ", new_left_right)
-    # print("Insertion index was ", insertion_point_index)
-    if len(new_left_right) == 3:  # We have split a line
-        node_types = [LINE, LINE, LINE]
-        middle = 1
-    else:
-        node_types = [CURVE, OFFCURVE, OFFCURVE, CURVE, OFFCURVE, OFFCURVE, CURVE]
-        middle = 3
-    nodes_to_insert = [GSNode(x, typ) for x, typ in zip(new_left_right, node_types)]
-    set_locally_forced(nodes_to_insert[middle])
-    newnodes = list(path.nodes)
-    newnodes[insertion_point_index : insertion_point_index + middle + 1] = (
-        nodes_to_insert
-    )
-    # Copy any forcing
-    forced_positions = [x.position for x in path.nodes if isForced(x)]
-    for node in newnodes:
-        for pt in forced_positions:
-            if distance(node.position, pt) < 0.5:
-                set_locally_forced(node)
-    path.nodes = newnodes
-    # print("New path nodes", path.nodes)
-
-
-def boundsIntersect(bounds1, bounds2):
-    return (
-        bounds1.origin.x <= bounds2.origin.x + bounds2.size.width
-        and bounds1.origin.x + bounds1.size.width >= bounds2.origin.x
-        and bounds1.origin.y <= bounds2.origin.y + bounds2.size.height
-        and bounds1.origin.y + bounds1.size.height >= bounds2.origin.y
-    )
+                kept.append(t)
+                last = pt
+        if not kept:
+            continue
+
+        # (point, type, forced, smooth) for each new node
+        newnodes = []
+        if len(seg) == 2:
+            for t in kept:
+                newnodes.append((linePointAtT(*seg, t), LINE_CODE, True, False))
+        else:
+            pieces = splitCubicAtT(*seg, *kept)
+            for piece in pieces[:-1]:
+                newnodes.append((piece[1], OFFCURVE_CODE, False, False))
+                newnodes.append((piece[2], OFFCURVE_CODE, False, False))
+                newnodes.append((piece[3], CURVE_CODE, True, False))
+            newnodes.append((pieces[-1][1], OFFCURVE_CODE, False, False))
+            newnodes.append((pieces[-1][2], OFFCURVE_CODE, False, False))
+
+        # The new nodes replace the segment's off-curve points, just before
+        # its end node. If the segment wraps around the end of the contour,
+        # they go at the end instead.
+        drop.update(indices[1:-1])
+        if indices[0] >= indices[-1]:
+            tail = newnodes
+        else:
+            before[indices[-1]] = newnodes
+
+    newnodes = []
+    for node_ix in range(len(points)):
+        if node_ix in drop:
+            continue
+        newnodes.extend(before.get(node_ix, []))
+        newnodes.append(
+            (points[node_ix], types[node_ix], forced[node_ix], smooth[node_ix])
+        )
+    newnodes.extend(tail)
+    return tuple([node[field] for node in newnodes] for field in range(4))
+
+
+def segmentBounds(seg: TupleSegment) -> tuple[float, float, float, float]:
+    # The bounds of the control points contain the curve, which is all
+    # the broadphase needs.
+    xs = [pt[0] for pt in seg]
+    ys = [pt[1] for pt in seg]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def candidateSegmentPairs(geometry: Geometry):
+    """Find pairs of segments from different contours whose bounds overlap.
+
+    This is a sort-and-sweep over the segments' x extents. Yields tuples
+    of (contour index, segment index, segment, contour index, segment index,
+    segment), with the first contour index lower than the second. Segments
+    are returned as tuples, and pairs between identical contours are
+    skipped."""
+    # Detect identical contours by hashing, rather than comparing every pair
+    path_keys = []
+    for pi in range(len(geometry)):
+        start, end = geometry.offsets[pi], geometry.offsets[pi + 1]
+        path_keys.append(
+            (
+                geometry.coords[2 * start : 2 * end].tobytes(),
+                geometry.types[start:end].tobytes(),
+            )
+        )
+    entries = []
+    for pi in range(len(geometry)):
+        for si, tseg in enumerate(geometry.segments(pi)):
+            entries.append((segmentBounds(tseg), pi, si, tseg))
+    entries.sort(key=lambda entry: entry[0][0])
+    active = []
+    for entry in entries:
+        (xmin, _, ymin, ymax), pi, si, tseg = entry
+        active = [other for other in active if other[0][1] >= xmin]
+        for other in active:
+            (_, _, other_ymin, other_ymax), pj, sj, other_tseg = other
+            if pi == pj or path_keys[pi] == path_keys[pj]:
+                continue
+            if other_ymin > ymax or other_ymax < ymin:
+                continue
+            if pi < pj:
+                yield pi, si, tseg, pj, sj, other_tseg
+            else:
+                yield pj, sj, other_tseg, pi, si, tseg
+        active.append(entry)
 
 
-def splitPathsAtIntersections(paths):
+def splitPathsAtIntersections(
+    geometry: Geometry, counters: Optional[dict] = None
+) -> Geometry:
     # We don't necessarily need to split the paths; we can
     # get away with adding a new node and setting it to forced.
-    if len(paths) == 1:
-        return
-    for ix, p1 in enumerate(paths):
-        p1_kurbo = path_to_kurbo(p1)
-        p1_bounds = p1_kurbo.bounding_box()
-        # Compiling the list of segments is expensive (and their bounds)
-        # is expensive, do it in advance
-        segs1 = p1.segments
-        s1_bboxes = [seg_to_kurbo(s).bounding_box() for s in segs1]
-        for p2 in list(paths)[ix + 1 :]:  # list() needed for GlyphsApp
-            # Stupid case of two identical paths
-            if str(p1.nodes) == str(p2.nodes):
-                continue
-            p2_kurbo = path_to_kurbo(p2)
-            if not kurbo_bounds_intersect(p1_bounds, p2_kurbo.bounding_box()):
+    if len(geometry) <= 1:
+        return geometry
+    # Collect all the intersections first, by contour and segment, and then
+    # split each contour once.
+    insertions = [defaultdict(list) for _ in range(len(geometry))]
+    for pi, si, s1, pj, sj, s2 in candidateSegmentPairs(geometry):
+        intersections = findIntersections(s1, s2)
+        for i in intersections:
+            if not (i.t1 >= 0 and i.t1 <= 1) or not (i.t2 >= 0 and i.t2 <= 1):
                 continue
-            for s1, bbox1 in zip(segs1, s1_bboxes):
-                for s2 in p2.segments:
-                    if not kurbo_bounds_intersect(
-                        bbox1, seg_to_kurbo(s2).bounding_box()
-                    ):
-                        continue
-                    intersections = findIntersections(s1, s2)
-                    for i in intersections:
-                        if not (i.t1 >= 0 and i.t1 <= 1) or not (
-                            i.t2 >= 0 and i.t2 <= 1
-                        ):
-                            continue
-                        # print(
-                        #     "Intersection between %s/%s and %s/%s at %s"
-                        #     % (p1, s1, p2, s2, i.pt)
-                        # )
-                        insertPointInPathUnlessThere(p1, i.pt)
-                        insertPointInPathUnlessThere(p2, i.pt)
+            insertions[pi][si].append(i.t1)
+            insertions[pj][sj].append(i.t2)
+            if counters is not None:
+                counters["intersections"] = counters.get("intersections", 0) + 1
+    if not any(insertions):
+        return geometry
+    result = Geometry()
+    for ix, contour_insertions in enumerate(insertions):
+        if contour_insertions:
+            points, types, forced, smooth = insertForcedNodes(
+                geometry, ix, contour_insertions
+            )
+        else:
+            start, end = geometry.offsets[ix], geometry.offsets[ix + 1]
+            points = geometry.contour_points(ix)
+            types = geometry.types[start:end]
+            forced = geometry.forced[start:end]
+            smooth = geometry.smooth[start:end]
+        result.append_contour(points, types, geometry.closed[ix], forced, smooth)
+    return result
+
+
+def remove_overlapping_centers(
+    centers: list[Center], dotsize: float
+) -> list[TuplePoint]:
+    """Drop any center closer than dotsize to one already accepted.
+
+    Forced centers are considered first, and otherwise centers are taken
+    in order. Accepted centers are bucketed in a grid of dotsize cells, so
+    each candidate is only compared against the nine cells around it."""
+    # Sort, to put forced points first
+    ordered = sorted(centers, key=lambda pt: pt.forced, reverse=True)
+    if dotsize <= 0:
+        return [c.pos for c in ordered]
+    newcenters = []
+    grid = {}
+    for c in ordered:
+        cx = math.floor(c.pos[0] / dotsize)
+        cy = math.floor(c.pos[1] / dotsize)
+        if any(
+            distance(c.pos, nc) < dotsize
+            for gx in (cx - 1, cx, cx + 1)
+            for gy in (cy - 1, cy, cy + 1)
+            for nc in grid.get((gx, gy), ())
+        ):
+            continue
+        newcenters.append(c.pos)
+        grid.setdefault((cx, cy), []).append(c.pos)
+    return newcenters
 
 
 class Dotter(Effect):
@@ -337,78 +419,71 @@ class Dotter(Effect):
         },
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Contour source layers decomposed during this run
+        self._decomposed = {}
+
     @property
     def display_params(self):
         return ["dotSize", "dotSpacing"]
 
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
         if layer.parent.name == "_dot":
             return layer.shapes
-        self._resolved_params = {
-            p: self.parameter(p, layer) for p in self.params.keys()
-        }
-        contour_source = self._resolved_params["contourSource"]
-        if contour_source != "<Default>" and layer.parent.layers[contour_source]:
-            sourcelayer = layer.parent.layers[contour_source]
-        else:
-            sourcelayer = layer
+        self._resolved_params = self.parameters(layer)
+        geometry = self.contour_source(layer, self._resolved_params["contourSource"])
+        if geometry is None:
+            geometry = shapes
         centers = []
-        paths = decomposedPaths(sourcelayer)
         if self._resolved_params["splitPaths"]:
-            splitPathsAtIntersections(paths)
-        for path in paths:
-            for subpath in splitAtForcedNode(path):
-                findCenters(subpath, self._resolved_params, centers, layer.parent.name)
-        new_paths = self.centers_to_paths(centers)
-
-        for path in sourcelayer.paths:
-            for node in path.nodes:
-                clear_locally_forced(node)
-        return new_paths
+            geometry = splitPathsAtIntersections(geometry, self.counters)
+        for ix in range(len(geometry)):
+            for segments in splitAtForcedNode(geometry, ix):
+                findCenters(segments, self._resolved_params, centers, layer.parent.name)
+        return self.centers_to_paths(centers)
+
+    def cache_key(self, layer: GSLayer):
+        key = super().cache_key(layer)
+        key["glyph"] = layer.parent.name if layer.parent.name == "_dot" else None
+        if self.instance:
+            key["componentSize"] = self.resolved_parameters()["dotSize"]
+        geometry = self.contour_source(layer, key["params"]["contourSource"])
+        if geometry is not None:
+            key["contourSource"] = geometry.fingerprint()
+        return key
+
+    def contour_source(self, layer: GSLayer, contour_source: str) -> Optional[Geometry]:
+        """Return the decomposed geometry of the layer's contour source, if any."""
+        if contour_source == "<Default>":
+            return None
+        source = self.index.layer_named(layer.parent.name, contour_source)
+        if source is None:
+            return None
+        return Geometry.from_layer(source, self._decomposed, self.index)
 
     def postprocess_font(self):
-        # Add the component glyph
-        if self.font.glyphs["_dot"]:
-            glyph = self.font.glyphs["_dot"]
-        else:
-            glyph = GSGlyph("_dot")
-            self.font.glyphs.append(glyph)
-        size = self._resolved_params["dotSize"]
-        for master in self.font.masters:
-            if glyph.layers[master.id]:
-                layer = glyph.layers[master.id]
-                layer.shapes = []
-            else:
-                layer = GSLayer()
-                if hasattr(glyph, "_setupLayer"):
-                    glyph._setupLayer(layer, master.id)
-                else:
-                    layer.layerId = master.id
-                    layer.associatedMasterId = master.id
-                glyph.layers.append(layer)
+        self._decomposed.clear()
+        # Add the component glyph. Size the dot for the instance, not for
+        # whichever layer happened to be processed last; centers_to_paths
+        # scales relative to this.
+        size = self.parameter("dotSize", None)
+        for layer in self.component_glyph_layers("_dot").values():
             layer.paths.append(makeCircle((0, 0), size / 2))
 
     def centers_to_paths(self, centers: list[Center]):
         dotsize = self._resolved_params["dotSize"]
         if self._resolved_params["preventOverlaps"]:
-            newcenters = []
-            # Sort, to put forced points first
-            for c in sorted(centers, key=lambda pt: pt.forced, reverse=True):
-                # This could probably be improved...
-                ok = True
-                for nc in newcenters:
-                    if distance(c.pos, nc) < dotsize:
-                        ok = False
-                        break
-                if ok:
-                    newcenters.append(c.pos)
+            newcenters = remove_overlapping_centers(centers, dotsize)
         else:
             newcenters = [c.pos for c in centers]
+        self.counters["dots"] = len(centers)
+        self.counters["dotsKept"] = len(newcenters)
 
         # If we are in Glyphsapp, then we want to draw a dot
         if self.preview or not self.instance:
             return [makeCircle(c, dotsize / 2) for c in newcenters]
-        component_size = self.instance.customParameters[KEY + ".dotSize"]
+        component_size = self.resolved_parameters()["dotSize"]
         components = []
         for center in newcenters:
             comp = GSComponent("_dot", (int(round(center[0])), int(round(center[1]))))
@@ -1,10 +1,13 @@
 import math
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from pendot.constants import KEY
 from pendot.effect import Effect
-from pendot.glyphsbridge import GSLayer, GSShape
-from pendot.utils import makeRect
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSComponent, GSLayer
+from pendot.utils import TuplePoint, makeRect
+
+COMPONENT_PREFIX = "_guideline."
 
 
 class Guidelines(Effect):
@@ -26,80 +29,189 @@ class Guidelines(Effect):
             "default": 0,
             "help": "Quantize the guidelines to a multiple of this value",
         },
+        "guidelineComponents": {
+            "default": False,
+            "help": "Draw guidelines as components of shared glyphs rather than as paths in every glyph",
+        },
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Most glyphs share a handful of widths, so the metrics of each
+        # master and the rectangles of each guideline span are only worked
+        # out once.
+        self._metrics = {}
+        self._rects = {}
+
     @property
     def display_params(self):
         return []
 
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
-        if not layer.master:
-            return []
-        if layer.parent.userData.get(KEY + ".disableGuidelines"):
-            return []
-        gloverlap = self.parameter("guidelineOverlap", layer)
-        guidelines = self.parameter("guidelines", layer)
-
-        fontmetrics = layer.parent.parent.metrics
-        mastermetrics = layer.master.metrics
+    def cache_key(self, layer: GSLayer):
+        key = {
+            **super().cache_key(layer),
+            "width": layer.width,
+            "disabled": bool(layer.parent.userData.get(KEY + ".disableGuidelines")),
+        }
+        if layer.master:
+            key["metrics"] = self.master_metrics(layer.master)
+        return key
 
-        newshapes = []
+    def master_metrics(self, master) -> Dict[str, float]:
+        if master.id not in self._metrics:
+            self._metrics[master.id] = self._compute_master_metrics(master)
+        return self._metrics[master.id]
 
+    def _compute_master_metrics(self, master) -> Dict[str, float]:
+        fontmetrics = self.font.metrics
+        mastermetrics = master.metrics
         if callable(mastermetrics):  # Glyphs.app
             mastermetrics = mastermetrics()
             fontmetrics = [x.title.lower() for x in fontmetrics]
         else:
             fontmetrics = [x.type.lower() for x in fontmetrics]
-        metricsdict = {
+        return {
             metric: value.position for metric, value in zip(fontmetrics, mastermetrics)
         }
-        for guideline in guidelines:
-            height, thickness = guideline["height"], guideline["thickness"]
-            if str(height).lower() in metricsdict:
-                height = metricsdict[height.lower()]
-            else:
-                try:
-                    height = float(height)
-                except ValueError:
-                    continue
+
+    def resolve_guideline(
+        self, guideline: dict, metricsdict: Dict[str, float]
+    ) -> Optional[Tuple[float, float]]:
+        """Return the height and thickness of a guideline, or None if either
+        can't be resolved."""
+        height, thickness = guideline["height"], guideline["thickness"]
+        if str(height).lower() in metricsdict:
+            height = metricsdict[height.lower()]
+        else:
             try:
-                thickness = float(thickness)
+                height = float(height)
             except ValueError:
-                continue
+                return None
+        try:
+            thickness = float(thickness)
+        except ValueError:
+            return None
+        return height, thickness
+
+    def guideline_span(
+        self, guideline: dict, width: float, params: dict
+    ) -> Tuple[float, float]:
+        """Return the left and right edges of a guideline across a glyph."""
+        gloverlap = params["guidelineOverlap"]
+        left = -gloverlap
+        right = width + gloverlap
+        quantization = params["guidelineQuantize"]
+        dashPattern = guideline.get("dashPattern")
+        if dashPattern:
+            dashlength = sum(dashPattern)
+            # dashlength_nogap = sum(dashPattern[:-1])
+            # Adjust quantization to fit the nearest
+            quantization = math.ceil(quantization / dashlength) * dashlength
+        if quantization:
+            left = math.floor(left / quantization) * quantization
+            right = math.ceil(right / quantization) * quantization
+        return left, right
+
+    def guideline_runs(
+        self, guideline: dict, left: float, right: float
+    ) -> List[Tuple[float, float]]:
+        """Return the left and right edges of each dash of a guideline."""
+        dashPattern = guideline.get("dashPattern")
+        if not dashPattern:
+            return [(left, right)]
+        lrs = []
+        while True:
+            for i in range(0, len(dashPattern), 2):
+                lrs.append((left, left + dashPattern[i]))
+                left += dashPattern[i]
+                if left > right:
+                    break
+                left += dashPattern[i + 1]
+                if left > right:
+                    break
+            if left > right:
+                break
+        return lrs
+
+    def guideline_rects(
+        self, master, guideline: dict, left: float, right: float
+    ) -> List[Tuple[TuplePoint, TuplePoint]]:
+        """Return the bottom left and top right of each rectangle making up
+        a guideline between left and right in the given master."""
+        key = (
+            master.id,
+            left,
+            right,
+            str(guideline["height"]),
+            str(guideline["thickness"]),
+            tuple(guideline.get("dashPattern") or ()),
+        )
+        if key not in self._rects:
+            resolved = self.resolve_guideline(guideline, self.master_metrics(master))
+            rects = []
+            if resolved is not None:
+                height, thickness = resolved
+                rects = [
+                    ((runleft, height), (runright, height + thickness))
+                    for runleft, runright in self.guideline_runs(guideline, left, right)
+                ]
+            self._rects[key] = rects
+        return self._rects[key]
 
-            left = -gloverlap
-            right = layer.width + gloverlap
-            quantization = self.parameter("guidelineQuantize", layer)
-            dashlength = 0
-            dashPattern = guideline.get("dashPattern")
-            if dashPattern:
-                dashlength = sum(dashPattern)
-                # dashlength_nogap = sum(dashPattern[:-1])
-                # Adjust quantization to fit the nearest
-                quantization = math.ceil(quantization / dashlength) * dashlength
-            if quantization:
-                left = math.floor(left / quantization) * quantization
-                right = math.ceil(right / quantization) * quantization
-
-            if not dashPattern:
-                lrs = [(left, right)]
-            else:
-                lrs = []
-                while True:
-                    for i in range(0, len(dashPattern), 2):
-                        lrs.append((left, left + dashPattern[i]))
-                        left += dashPattern[i]
-                        if left > right:
-                            break
-                        left += dashPattern[i + 1]
-                        if left > right:
-                            break
-                    if left > right:
-                        break
-
-            for left, right in lrs:
-                bottomLeft = (left, height)
-                topRight = (right, height + thickness)
-                layerRect = makeRect(bottomLeft, topRight)
-                newshapes.append(layerRect)
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
+        if not layer.master:
+            return []
+        if layer.parent.userData.get(KEY + ".disableGuidelines"):
+            return []
+        params = self.parameters(layer)
+        guidelines = params["guidelines"]
+        metricsdict = self.master_metrics(layer.master)
+        # Components refer to guidelines by their position in the instance's
+        # list, so only use them if this layer doesn't override the list.
+        use_components = (
+            params["guidelineComponents"]
+            and not self.preview
+            and self.instance
+            and guidelines is self.resolved_parameters()["guidelines"]
+        )
+
+        newshapes = []
+        for ix, guideline in enumerate(guidelines):
+            left, right = self.guideline_span(guideline, layer.width, params)
+            if use_components:
+                if self.resolve_guideline(guideline, metricsdict) is None:
+                    continue
+                name = f"{COMPONENT_PREFIX}{ix}.{right - left:.10g}"
+                component = GSComponent(name, (left, 0))
+                component.alignment = -1
+                newshapes.append(component)
+                continue
+            for bottomLeft, topRight in self.guideline_rects(
+                layer.master, guideline, left, right
+            ):
+                newshapes.append(makeRect(bottomLeft, topRight))
         return newshapes
+
+    def postprocess_font(self):
+        self._rects.clear()
+        self._metrics.clear()
+        if not self.resolved_parameters()["guidelineComponents"]:
+            return
+        # Layers may have come from worker processes or the cache, so find
+        # the guideline components by looking at the font itself.
+        names = set()
+        for glyph in self.font.glyphs:
+            for layer in glyph.layers:
+                for component in layer.components:
+                    if component.name.startswith(COMPONENT_PREFIX):
+                        names.add(component.name)
+        guidelines = self.resolved_parameters()["guidelines"]
+        masters = {master.id: master for master in self.font.masters}
+        for name in sorted(names):
+            ix, length = name[len(COMPONENT_PREFIX) :].split(".", 1)
+            guideline = guidelines[int(ix)]
+            for master_id, layer in self.component_glyph_layers(name).items():
+                for bottomLeft, topRight in self.guideline_rects(
+                    masters[master_id], guideline, 0, float(length)
+                ):
+                    layer.paths.append(makeRect(bottomLeft, topRight))
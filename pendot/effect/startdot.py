@@ -1,7 +1,6 @@
-from typing import List
-
 from pendot.effect import Effect
-from pendot.glyphsbridge import GSLayer, GSShape
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSComponent, GSLayer
 from pendot.utils import makeCircle
 
 
@@ -12,13 +11,42 @@ class StartDot(Effect):
     def display_name(self):
         return "Start Dot"
 
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
-        newshapes = []
-        for shape in shapes:
-            if not shape.nodes:
-                continue
-            start = (shape.nodes[0].position.x, shape.nodes[0].position.y)
-            newshapes.append(
-                makeCircle(start, self.parameter("startDotSize", layer) / 2)
-            )
-        return newshapes
+    def cache_key(self, layer: GSLayer):
+        return {
+            **super().cache_key(layer),
+            "glyph": layer.parent.name if layer.parent.name == "_startdot" else None,
+            "componentSize": self.resolved_parameters()["startDotSize"],
+        }
+
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
+        if layer.parent.name == "_startdot":
+            return layer.shapes
+        dotsize = self.parameter("startDotSize", layer)
+        starts = []
+        for ix in range(len(shapes)):
+            nodes = shapes.contour_range(ix)
+            if nodes:
+                starts.append(shapes.point(nodes.start))
+
+        # If we are in Glyphsapp, then we want to draw a dot
+        if self.preview or not self.instance:
+            return [makeCircle(start, dotsize / 2) for start in starts]
+        component_size = self.resolved_parameters()["startDotSize"]
+        components = []
+        for start in starts:
+            comp = GSComponent("_startdot", start)
+            if dotsize != component_size:
+                comp.scale = (
+                    dotsize / component_size,
+                    dotsize / component_size,
+                )
+            comp.alignment = -1
+            components.append(comp)
+        return components
+
+    def postprocess_font(self):
+        if self.preview or not self.instance:
+            return
+        size = self.resolved_parameters()["startDotSize"]
+        for layer in self.component_glyph_layers("_startdot").values():
+            layer.paths.append(makeCircle((0, 0), size / 2))
@@ -1,28 +1,56 @@
-from dataclasses import dataclass
-from typing import List, Optional
-
-from ufostroker.ufostroker import constant_width_stroke as cws_rust
+from typing import List, NamedTuple, Optional
 
 from pendot.effect import Effect
-from pendot.glyphsbridge import CURVE, LINE, OFFCURVE, GSNode, GSPath, GSLayer, GSShape
+from pendot.geometry import OFFCURVE_CODE, TYPE_NAMES, Geometry
+from pendot.glyphsbridge import CURVE, LINE, OFFCURVE, GSNode, GSPath, GSLayer
 
 type_map = {"": OFFCURVE, "curve": CURVE, "line": LINE}
 
 
-@dataclass
-class Point:
+# The stroker reads x, y and type attributes from each point; a named
+# tuple is the cheapest object which provides them.
+class Point(NamedTuple):
     x: float
     y: float
     type: Optional[str]  # move,line,curve,None
 
-    @classmethod
-    def fromGSPoint(cls, pt, ix=None):
-        typ = pt.type
-        if typ == OFFCURVE:
-            typ = None
-        if ix is not None and ix == 0:
-            typ = "move"
-        return cls(pt.position.x, pt.position.y, typ)
+
+# Stroker point types, indexed by Geometry type code
+STROKER_TYPES = tuple(
+    None if code == OFFCURVE_CODE else TYPE_NAMES[code]
+    for code in range(len(TYPE_NAMES))
+)
+
+
+def marshal_geometry(geometry: Geometry) -> List[List[Point]]:
+    """Convert a Geometry into the stroker's input, one list per contour.
+
+    This works on slices of the geometry's flat buffers, without going
+    through a method call per node."""
+    xs = geometry.coords[0::2]
+    ys = geometry.coords[1::2]
+    types = [STROKER_TYPES[code] for code in geometry.types]
+    offsets = geometry.offsets
+    contours = []
+    for start, end in zip(offsets, offsets[1:]):
+        points = list(map(Point, xs[start:end], ys[start:end], types[start:end]))
+        if points:
+            points[0] = Point(points[0].x, points[0].y, "move")
+        contours.append(points)
+    return contours
+
+
+def paths_from_result(result) -> List[GSPath]:
+    """Convert the stroker's output into closed GSPaths."""
+    newpaths = []
+    for res_path in result:
+        path = GSPath()
+        path.closed = True
+        # Assign the whole node list at once; appending goes through a
+        # new proxy object for every node.
+        path.nodes = [GSNode((x, y), type_map[typ]) for x, y, typ in res_path]
+        newpaths.append(path)
+    return newpaths
 
 
 class Stroker(Effect):
@@ -67,19 +95,12 @@ class Stroker(Effect):
     def display_params(self):
         return ["strokerWidth"]
 
-    def process_layer_shapes(self, layer: GSLayer, shapes: List[GSShape]):
-        if not shapes:
-            return []
-        list_of_list_of_nodes = []
-
-        for path in shapes:
-            list_of_list_of_nodes.append(
-                [Point.fromGSPoint(p, ix) for ix, p in enumerate(path.nodes)]
-            )
-
-        startcap = self.parameter("startCap", layer).lower()
-        endcap = self.parameter("endCap", layer).lower()
-        jointype = self.parameter("joinType", layer).lower()
+    def stroke_options(self, layer: GSLayer) -> dict:
+        """Return the stroker arguments for the layer."""
+        params = self.parameters(layer)
+        startcap = params["startCap"].lower()
+        endcap = params["endCap"].lower()
+        jointype = params["joinType"].lower()
         if startcap not in self.params["startCap"]["choices"]:
             raise ValueError("Unknown start cap type")
         if endcap not in self.params["endCap"]["choices"]:
@@ -87,27 +108,30 @@ class Stroker(Effect):
         if jointype not in self.params["joinType"]["choices"]:
             raise ValueError("Unknown join type")
 
-        height = self.parameter("strokerHeight", layer)
+        height = params["strokerHeight"]
         if height is None or not height:
-            height = self.parameter("strokerWidth", layer)
+            height = params["strokerWidth"]
 
-        result = cws_rust(
-            list_of_list_of_nodes,
-            width=float(self.parameter("strokerWidth", layer)) / 2,
+        return dict(
+            width=float(params["strokerWidth"]) / 2,
             height=float(height) / 2,
-            angle=float(self.parameter("strokerAngle", layer) or 0),
+            angle=float(params["strokerAngle"] or 0),
             startcap=startcap,
             endcap=endcap,
             jointype=jointype,
-            remove_internal=bool(self.parameter("removeInternal", layer)),
-            remove_external=bool(self.parameter("removeExternal", layer)),
-            segmentwise=bool(self.parameter("segmentWise", layer)),
+            remove_internal=bool(params["removeInternal"]),
+            remove_external=bool(params["removeExternal"]),
+            segmentwise=bool(params["segmentWise"]),
         )
-        newpaths = []
-        for res_path in result:
-            path = GSPath()
-            path.closed = True
-            for x, y, typ in res_path:
-                path.nodes.append(GSNode((x, y), type_map[typ]))
-            newpaths.append(path)
-        return newpaths
+
+    def stroke(self, shapes: Geometry, options: dict) -> List[GSPath]:
+        from ufostroker.ufostroker import constant_width_stroke
+
+        return paths_from_result(
+            constant_width_stroke(marshal_geometry(shapes), **options)
+        )
+
+    def process_layer_shapes(self, layer: GSLayer, shapes: Geometry):
+        if not len(shapes):
+            return []
+        return self.stroke(shapes, self.stroke_options(layer))
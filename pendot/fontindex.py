@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from pendot.glyphsbridge import GSComponent, GSFont, GSGlyph, GSLayer
+
+
+class FontIndex:
+    """Lookup tables for a font's glyphs, layers and components.
+
+    Built once per run by transform_font and shared with the effects, so
+    that finding a glyph's layer for a master, a layer by name, or the
+    glyphs which use a glyph as a component does not mean scanning the
+    font again. Glyphs added during the run should be registered with
+    ``add_glyph``."""
+
+    def __init__(self, font: GSFont):
+        self.font = font
+        self.glyphs: Dict[str, GSGlyph] = {}
+        # (glyph name, layer ID) to layers; normally only one
+        self._layers: Dict[Tuple[str, str], List[GSLayer]] = {}
+        self._named_layers: Dict[Tuple[str, str], GSLayer] = {}
+        # Names of the glyphs each glyph uses as components, and the reverse
+        self.bases: Dict[str, List[str]] = {}
+        self.users: Dict[str, Set[str]] = {}
+        for glyph in font.glyphs:
+            self.add_glyph(glyph)
+
+    def add_glyph(self, glyph: GSGlyph):
+        self.glyphs[glyph.name] = glyph
+        bases = []
+        for layer in glyph.layers:
+            self.add_layer(layer)
+            for component in layer.components:
+                if component.name not in bases:
+                    bases.append(component.name)
+        self.bases[glyph.name] = bases
+        for base in bases:
+            self.users.setdefault(base, set()).add(glyph.name)
+
+    def add_layer(self, layer: GSLayer):
+        name = layer.parent.name
+        self._layers.setdefault((name, layer.layerId), []).append(layer)
+        self._named_layers.setdefault((name, layer.name), layer)
+
+    def layer(self, glyph: str, layer_id: str) -> Optional[GSLayer]:
+        layers = self._layers.get((glyph, layer_id))
+        return layers[0] if layers else None
+
+    def layers(self, glyph: str, layer_id: str) -> List[GSLayer]:
+        return self._layers.get((glyph, layer_id), [])
+
+    def layer_named(self, glyph: str, name: str) -> Optional[GSLayer]:
+        """Find a glyph's layer by name, or failing that by layer ID."""
+        return self._named_layers.get((glyph, name)) or self.layer(glyph, name)
+
+    def component_layer(self, component: GSComponent) -> Optional[GSLayer]:
+        """Return the base glyph's layer for the component's master."""
+        return self.layer(component.name, component.parent.layerId)
+
+    def component_order(self) -> List[GSGlyph]:
+        """Return the font's glyphs, with each glyph after its components."""
+        ordered = []
+        seen = set()
+
+        def visit(name):
+            if name in seen or name not in self.glyphs:
+                return
+            seen.add(name)
+            for base in self.bases[name]:
+                visit(base)
+            ordered.append(self.glyphs[name])
+
+        for name in self.glyphs:
+            visit(name)
+        return ordered
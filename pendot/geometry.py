@@ -0,0 +1,323 @@
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from fontTools.misc.transform import Identity, Transform
+
+from pendot.constants import KEY
+from pendot.fontindex import FontIndex
+from pendot.glyphsbridge import (
+    CURVE,
+    LINE,
+    OFFCURVE,
+    QCURVE,
+    GSComponent,
+    GSLayer,
+    GSNode,
+    GSPath,
+    GSShape,
+)
+from pendot.utils import TuplePoint, TupleSegment, gc_paused
+
+# Node type codes
+LINE_CODE = 0
+CURVE_CODE = 1
+OFFCURVE_CODE = 2
+QCURVE_CODE = 3
+
+TYPE_CODES = {
+    LINE: LINE_CODE,
+    CURVE: CURVE_CODE,
+    OFFCURVE: OFFCURVE_CODE,
+    QCURVE: QCURVE_CODE,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+def isForced(node: GSNode) -> bool:
+    return KEY in node.userData and (
+        node.userData[KEY].get("forced") or node.userData[KEY].get("locally_forced")
+    )
+
+
+class Geometry:
+    """A compact, array-backed set of contours.
+
+    Effects work on this rather than on GSPath/GSNode objects. Paths are
+    converted into it once when a layer is transformed, and effects convert
+    their results back with ``to_paths``.
+
+    ``coords`` holds the x and y of every node, interleaved; ``types``,
+    ``forced`` and ``smooth`` hold one entry per node. Contour ``i`` is made
+    of nodes ``offsets[i]`` to ``offsets[i + 1]``, and ``closed[i]`` says
+    whether it is closed."""
+
+    __slots__ = ("coords", "types", "forced", "smooth", "offsets", "closed")
+
+    def __init__(self):
+        self.coords = array("d")
+        self.types = array("B")
+        self.forced = array("B")
+        self.smooth = array("B")
+        self.offsets = array("q", [0])
+        self.closed = array("B")
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[GSPath]) -> "Geometry":
+        geometry = cls()
+        for path in paths:
+            geometry.append_path(path)
+        return geometry
+
+    @classmethod
+    def from_layer(
+        cls,
+        layer: GSLayer,
+        cache: Optional["DecomposedGeometry"] = None,
+        index: Optional[FontIndex] = None,
+    ) -> "Geometry":
+        """Decompose a layer, including its components.
+
+        If a ``cache`` dictionary is given, the decomposed geometry of the
+        layer and of every component layer is stored in it, keyed by
+        (glyph name, layer ID), and components found there are reused
+        rather than decomposed again. Cached geometry must not be modified.
+        Component layers are looked up in the ``index``, if one is given.
+        """
+        if cache is None:
+            cache = {}
+        key = (layer.parent.name, layer.layerId)
+        if key in cache:
+            return cache[key]
+        if hasattr(layer, "copyDecomposedLayer"):
+            geometry = cls.from_paths(layer.copyDecomposedLayer().paths)
+        else:
+            geometry = cls()
+            for shape in layer.shapes:
+                if isinstance(shape, GSPath):
+                    geometry.append_path(shape)
+                else:
+                    base = index.component_layer(shape) if index else shape.layer
+                    if base is None:
+                        continue
+                    geometry.extend(
+                        cls.from_layer(base, cache, index), Transform(*shape.transform)
+                    )
+        cache[key] = geometry
+        return geometry
+
+    def append_path(self, path: GSPath):
+        nodes = list(path.nodes)
+        coords = self.coords
+        for node in nodes:
+            position = node.position
+            coords.append(position.x)
+            coords.append(position.y)
+        self.types.extend(TYPE_CODES[node.type] for node in nodes)
+        # Most glyphsLib nodes have no user data, so skip the proxy for
+        # those; nodes from Glyphs itself have no _userData and always ask
+        self.forced.extend(
+            bool(getattr(node, "_userData", True) and isForced(node)) for node in nodes
+        )
+        self.smooth.extend(bool(node.smooth) for node in nodes)
+        self.offsets.append(len(self.types))
+        self.closed.append(bool(path.closed))
+
+    def extend(self, other: "Geometry", transform: Transform = Identity):
+        """Append all of another geometry's contours, transformed."""
+        base = len(self.types)
+        if transform == Identity:
+            self.coords.extend(other.coords)
+        else:
+            coords = other.coords
+            for x, y in transform.transformPoints(zip(coords[0::2], coords[1::2])):
+                self.coords.append(x)
+                self.coords.append(y)
+        self.types.extend(other.types)
+        self.forced.extend(other.forced)
+        self.smooth.extend(other.smooth)
+        self.offsets.extend(base + offset for offset in other.offsets[1:])
+        self.closed.extend(other.closed)
+
+    def append_contour(
+        self,
+        points: List[TuplePoint],
+        types: List[int],
+        closed: bool = False,
+        forced: Optional[List[bool]] = None,
+        smooth: Optional[List[bool]] = None,
+    ):
+        for x, y in points:
+            self.coords.append(x)
+            self.coords.append(y)
+        self.types.extend(types)
+        self.forced.extend(forced or [0] * len(types))
+        self.smooth.extend(smooth or [0] * len(types))
+        self.offsets.append(len(self.types))
+        self.closed.append(bool(closed))
+
+    def to_paths(self) -> List[GSPath]:
+        paths = []
+        coords, types, smooth, forced = (
+            self.coords,
+            self.types,
+            self.smooth,
+            self.forced,
+        )
+        for ix in range(len(self)):
+            start, end = self.offsets[ix], self.offsets[ix + 1]
+            path = GSPath()
+            nodes = []
+            for x, y, node_type, node_smooth, node_forced in zip(
+                coords[2 * start : 2 * end : 2],
+                coords[2 * start + 1 : 2 * end : 2],
+                types[start:end],
+                smooth[start:end],
+                forced[start:end],
+            ):
+                node = GSNode((x, y), TYPE_NAMES[node_type], bool(node_smooth))
+                if node_forced:
+                    node.userData[KEY] = {"forced": True}
+                nodes.append(node)
+            path.nodes = nodes
+            path.closed = bool(self.closed[ix])
+            paths.append(path)
+        return paths
+
+    def __len__(self) -> int:
+        return len(self.closed)
+
+    def contour_range(self, ix: int) -> range:
+        return range(self.offsets[ix], self.offsets[ix + 1])
+
+    def point(self, node_ix: int) -> TuplePoint:
+        return (self.coords[2 * node_ix], self.coords[2 * node_ix + 1])
+
+    def contour_points(self, ix: int) -> List[TuplePoint]:
+        start, end = self.offsets[ix], self.offsets[ix + 1]
+        flat = self.coords[2 * start : 2 * end]
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def segment_indices(self, ix: int) -> List[List[int]]:
+        """Return the node indices making up each segment of a contour.
+
+        Segments are in the same order as GSPath.segments; for closed
+        contours, the first segment wraps around the end of the contour."""
+        start, end = self.offsets[ix], self.offsets[ix + 1]
+        count = end - start
+        oncurves = [
+            node_ix
+            for node_ix in range(start, end)
+            if self.types[node_ix] != OFFCURVE_CODE
+        ]
+        segments = []
+        for k, last in enumerate(oncurves):
+            first = oncurves[k - 1]
+            if k == 0:
+                if not self.closed[ix]:
+                    continue
+                segments.append(
+                    [
+                        start + (node_ix - start) % count
+                        for node_ix in range(first, last + count + 1)
+                    ]
+                )
+            else:
+                segments.append(list(range(first, last + 1)))
+        return segments
+
+    def segment_count(self) -> int:
+        count = 0
+        for ix in range(len(self)):
+            start, end = self.offsets[ix], self.offsets[ix + 1]
+            oncurves = sum(1 for code in self.types[start:end] if code != OFFCURVE_CODE)
+            count += oncurves if self.closed[ix] else max(oncurves - 1, 0)
+        return count
+
+    def segments(self, ix: int) -> List[TupleSegment]:
+        return [
+            [self.point(node_ix) for node_ix in indices]
+            for indices in self.segment_indices(ix)
+        ]
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for data in (
+            self.coords,
+            self.types,
+            self.forced,
+            self.smooth,
+            self.offsets,
+            self.closed,
+        ):
+            digest.update(data.tobytes())
+        return digest.hexdigest()
+
+
+# Decomposed geometry, keyed by (glyph name, layer ID)
+DecomposedGeometry = Dict[Tuple[str, str], Geometry]
+
+# A component as (glyph name, transform, alignment)
+PackedComponent = Tuple[str, Tuple[float, ...], int]
+PackedShapes = List[Union[Geometry, PackedComponent, GSShape]]
+
+
+def _is_plain_path(path: GSPath) -> bool:
+    # Whether a path survives a round trip through Geometry unchanged
+    if path.attributes:
+        return False
+    for node in path.nodes:
+        if not getattr(node, "_userData", True):
+            continue
+        data = node.userData
+        if data and (len(data) != 1 or data.get(KEY) != {"forced": True}):
+            return False
+    return True
+
+
+def _is_plain_component(component: GSComponent) -> bool:
+    return not (
+        component.anchor
+        or component.locked
+        or component.attributes
+        or component.smartComponentValues
+    )
+
+
+def pack_shapes(shapes: List[GSShape]) -> PackedShapes:
+    """Convert shapes into a compact form which is quick to pickle.
+
+    Each run of paths becomes a single Geometry, and each component a
+    (name, transform, alignment) tuple. Shapes carrying anything these
+    cannot hold, such as node user data other than the forced flag, are
+    kept as they are. ``unpack_shapes`` turns the result back into shapes.
+    """
+    packed = []
+    for shape in shapes:
+        if isinstance(shape, GSPath):
+            if _is_plain_path(shape):
+                if not packed or not isinstance(packed[-1], Geometry):
+                    packed.append(Geometry())
+                packed[-1].append_path(shape)
+                continue
+        elif _is_plain_component(shape):
+            packed.append((shape.name, tuple(shape.transform), shape.alignment))
+            continue
+        packed.append(shape)
+    return packed
+
+
+def unpack_shapes(packed: PackedShapes) -> List[GSShape]:
+    shapes = []
+    with gc_paused():
+        for item in packed:
+            if isinstance(item, Geometry):
+                shapes.extend(item.to_paths())
+            elif isinstance(item, tuple):
+                name, transform, alignment = item
+                component = GSComponent(name, transform=transform)
+                component.alignment = alignment
+                shapes.append(component)
+            else:
+                shapes.append(item)
+    return shapes
@@ -14,6 +14,7 @@ try:
         GSLINE,
         CURVE,
         LINE,
+        QCURVE,
         Message,
     )
 except ImportError:
@@ -28,6 +29,7 @@ except ImportError:
         OFFCURVE,  # noqa: F401
         CURVE,  # noqa: F401
         LINE,  # noqa: F401
+        QCURVE,  # noqa: F401
         GSLINE,  # noqa: F401
     )
     import sys
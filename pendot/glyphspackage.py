@@ -0,0 +1,92 @@
+import os
+from collections import OrderedDict
+from io import StringIO
+
+from fontTools.misc.filenames import userNameToFileName
+from glyphsLib.writer import Writer
+
+from pendot.glyphsbridge import GSFont
+
+
+class _FontInfoWriter(Writer):
+    # Leaves out the parts of the font which a package keeps elsewhere
+    def writeObjectKeyValue(self, d, key, *args, **kwargs):
+        if isinstance(d, GSFont) and key in ("glyphs", "DisplayStrings"):
+            return
+        super().writeObjectKeyValue(d, key, *args, **kwargs)
+
+
+def _dumps(font: GSFont, value, writer_class=Writer) -> str:
+    fp = StringIO()
+    writer_class(fp, format_version=font.format_version).writeValue(value)
+    fp.write("\n")
+    return fp.getvalue()
+
+
+def _write_if_changed(filename: str, contents: str) -> bool:
+    """Atomically replace the file if its contents differ, and say whether
+    it was written."""
+    data = contents.encode("utf-8")
+    try:
+        with open(filename, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmpname = f"{filename}.{os.getpid()}.tmp"
+    with open(tmpname, "wb") as f:
+        f.write(data)
+    os.replace(tmpname, filename)
+    return True
+
+
+def save_package(font: GSFont, path: str) -> int:
+    """Save the font as a .glyphspackage directory.
+
+    Each glyph is kept in its own file under ``glyphs/``. Only files whose
+    contents have changed are written, each through a temporary file, so
+    that unchanged glyph files keep their modification times; glyph files
+    left over from glyphs no longer in the font are removed. Returns the
+    number of files written.
+
+    Every glyph is still serialized in order to compare it with its file,
+    so this saves disk writes but not the cost of serializing the font.
+    Glyphs reused by an incremental run cannot be skipped: reuse only
+    looks at the relevant master's outline and the effect parameters, and
+    the glyph's other layers, width or unicodes may have changed."""
+    glyphs_dir = os.path.join(path, "glyphs")
+    os.makedirs(glyphs_dir, exist_ok=True)
+    written = 0
+
+    files = {
+        "fontinfo.plist": _dumps(font, font, _FontInfoWriter),
+        "order.plist": _dumps(font, [glyph.name for glyph in font.glyphs]),
+    }
+    if font.DisplayStrings:
+        strings = font.DisplayStrings
+        if isinstance(strings, str):
+            strings = [strings]
+        files["UIState.plist"] = _dumps(font, OrderedDict(displayStrings=list(strings)))
+    for filename, contents in files.items():
+        written += _write_if_changed(os.path.join(path, filename), contents)
+
+    glyph_files = set()
+    for glyph in font.glyphs:
+        filename = userNameToFileName(glyph.name, glyph_files, suffix=".glyph")
+        glyph_files.add(filename.lower())
+        written += _write_if_changed(
+            os.path.join(glyphs_dir, filename), _dumps(font, glyph)
+        )
+    for filename in os.listdir(glyphs_dir):
+        if filename.endswith(".glyph") and filename.lower() not in glyph_files:
+            os.remove(os.path.join(glyphs_dir, filename))
+    return written
+
+
+def save_font(font: GSFont, path: str):
+    """Save the font as a .glyphs file or, if the path ends in
+    .glyphspackage, as a package."""
+    if path.endswith(".glyphspackage"):
+        save_package(font, path)
+    else:
+        font.save(path)
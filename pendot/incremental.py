@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+from logging import getLogger
+from typing import Dict, List, Optional
+
+from pendot.cache import font_key, load_font
+from pendot.effect import Effect
+from pendot.fontindex import FontIndex
+from pendot.geometry import Geometry
+from pendot.glyphsbridge import GSFont, GSLayer, GSShape
+
+try:
+    from pendot._version import version as pendot_version
+except ImportError:
+    pendot_version = "unknown"
+
+logger = getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+
+def manifest_filename(output: str) -> str:
+    """Return the name of the manifest kept next to an output font."""
+    return output + ".pendot.json"
+
+
+def remove_manifest(output: str):
+    """Remove the manifest kept next to an output font, if there is one.
+
+    Called when the output is written without --incremental, as the
+    manifest would no longer describe it."""
+    try:
+        os.remove(manifest_filename(output))
+    except FileNotFoundError:
+        pass
+
+
+def _digest(description) -> str:
+    serialized = json.dumps(description, sort_keys=True, default=repr)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def outline_hash(layer: GSLayer, index: FontIndex, memo: Dict[tuple, str]) -> str:
+    """Hash a layer's own paths and its components.
+
+    Each component contributes its name, its transform and the outline
+    hash of its base layer, so a change to a base glyph changes the hash
+    of every glyph which uses it, however deeply nested."""
+    key = (layer.parent.name, layer.layerId)
+    if key in memo:
+        return memo[key]
+    # Guard against component cycles
+    memo[key] = None
+    components = []
+    for component in layer.components:
+        base = index.component_layer(component)
+        components.append(
+            [
+                component.name,
+                list(component.transform),
+                outline_hash(base, index, memo) if base is not None else None,
+            ]
+        )
+    memo[key] = _digest(
+        {
+            "paths": Geometry.from_paths(layer.paths).fingerprint(),
+            "components": components,
+        }
+    )
+    return memo[key]
+
+
+def glyph_hashes(
+    layers: List[GSLayer], effects: List[Effect], index: FontIndex
+) -> Dict[str, str]:
+    """Hash everything which goes into transforming each layer.
+
+    This is the layer's outline hash, together with each effect's cache
+    key for the layer: its resolved instance parameters and userData
+    overrides, and any other state the effect depends on."""
+    memo = {}
+    return {
+        layer.parent.name: _digest(
+            {
+                "version": pendot_version,
+                "outline": outline_hash(layer, index, memo),
+                "effects": [effect.cache_key(layer) for effect in effects],
+            }
+        )
+        for layer in layers
+    }
+
+
+class Incremental:
+    """Carry unchanged glyphs over from a previous run's output.
+
+    The manifest records a hash of each glyph's inputs (see ``glyph_hashes``)
+    as of the previous run, and a hash of the output file it describes; if
+    the output has changed since, the manifest is ignored. When
+    transform_font is given an Incremental, the layers whose hash is
+    unchanged take their shapes from the previous output font rather than
+    being transformed again; this includes every glyph whose components
+    are unchanged. ``save`` then records the hashes of this run next to
+    the new output."""
+
+    def __init__(self, previous: Optional[GSFont] = None, manifest: dict = None):
+        self.previous = previous
+        self.previous_hashes = {}
+        if manifest and manifest.get("version") == MANIFEST_VERSION:
+            self.previous_hashes = manifest.get("glyphs", {})
+        self.hashes = {}
+
+    @classmethod
+    def load(cls, output: str) -> "Incremental":
+        """Read the previous output font and its manifest, if both exist."""
+        manifest_file = manifest_filename(output)
+        if not os.path.exists(output) or not os.path.exists(manifest_file):
+            return cls()
+        try:
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable manifest {manifest_file}: {e}")
+            return cls()
+        # The output may have been rewritten since, by a run which did not
+        # keep the manifest up to date
+        if manifest.get("output") != font_key(output):
+            logger.warning(
+                f"Ignoring manifest {manifest_file}, as {output} has changed since"
+            )
+            return cls()
+        return cls(load_font(output), manifest)
+
+    def reuse(
+        self, layers: List[GSLayer], effects: List[Effect], index: FontIndex
+    ) -> Dict[GSLayer, List[GSShape]]:
+        """Return the previous output shapes of each unchanged layer."""
+        self.hashes = glyph_hashes(layers, effects, index)
+        reused = {}
+        if self.previous is None:
+            return reused
+        previous = FontIndex(self.previous)
+        for layer in layers:
+            name = layer.parent.name
+            if self.previous_hashes.get(name) != self.hashes[name]:
+                continue
+            previous_layer = previous.layer(name, layer.layerId)
+            if previous_layer is None:
+                continue
+            reused[layer] = list(previous_layer.shapes)
+        return reused
+
+    def save(self, output: str):
+        with open(manifest_filename(output), "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "pendot": pendot_version,
+                    "output": font_key(output),
+                    "glyphs": self.hashes,
+                },
+                f,
+                indent=2,
+            )
@@ -0,0 +1,94 @@
+import json
+import math
+from typing import Dict, List, Optional
+
+from pendot.glyphsbridge import GSLayer, GSPath
+
+DEFAULT_TOP = 20
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the nearest-rank percentile of the values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values, default=0.0),
+        "total": sum(values),
+    }
+
+
+def shape_counts(shapes) -> Dict[str, int]:
+    """Count the nodes and components in a list of output shapes."""
+    nodes = 0
+    components = 0
+    for shape in shapes:
+        if isinstance(shape, GSPath):
+            nodes += len(shape.nodes)
+        else:
+            components += 1
+    return {"nodes": nodes, "components": components}
+
+
+class Metrics:
+    """Per-glyph and per-effect measurements of a transform_font run.
+
+    transform_font fills in one record per transformed layer: the time
+    spent decomposing it, its segment count, and for each effect the
+    wall time, output node and component counts and any counters the
+    effect keeps (such as the Dotter's intersection and dot counts).
+    ``report`` adds font-wide summaries to these records."""
+
+    def __init__(self, top: int = DEFAULT_TOP):
+        self.top = top
+        self.glyphs = {}
+        self.decompose_times = {}
+
+    def add_decompose_time(self, layer: GSLayer, elapsed: float):
+        self.decompose_times[(layer.parent.name, layer.layerId)] = elapsed
+
+    def add_layer(self, layer: GSLayer, record: dict):
+        key = (layer.parent.name, layer.layerId)
+        if key in self.decompose_times:
+            record["decompose"] = self.decompose_times[key]
+        record["time"] = record.get("decompose", 0.0) + sum(
+            effect["time"] for effect in record.get("effects", {}).values()
+        )
+        self.glyphs[layer.parent.name] = record
+
+    def report(self) -> dict:
+        times = {name: record["time"] for name, record in self.glyphs.items()}
+        effect_times: Dict[str, List[float]] = {}
+        for record in self.glyphs.values():
+            for effect, stats in record.get("effects", {}).items():
+                effect_times.setdefault(effect, []).append(stats["time"])
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "summary": {
+                "glyphs": len(self.glyphs),
+                "cached": sum(
+                    1 for record in self.glyphs.values() if record.get("cached")
+                ),
+                "time": distribution(list(times.values())),
+                "decompose": distribution(
+                    [record.get("decompose", 0.0) for record in self.glyphs.values()]
+                ),
+                "effects": {
+                    effect: distribution(values)
+                    for effect, values in effect_times.items()
+                },
+                "slowest": slowest[: self.top],
+            },
+            "glyphs": self.glyphs,
+        }
+
+    def save(self, filename: str, report: Optional[dict] = None):
+        with open(filename, "w") as f:
+            json.dump(report or self.report(), f, indent=2)
@@ -17,10 +17,33 @@ class Pendot(GFBuilder):
                 "$outputDir", self.config["outputDir"]
             )
         self.source = glyphsLib.load(self.sources[0].path)
+        self.build_pendot_instances()
         for instance in self.source.instances:
             self.build_a_static(instance)
         return self.recipe
 
+    @property
+    def pendot_manifest(self):
+        family_name = self.sources[0].family_name
+        return "build/{}-pendot.json".format(family_name.replace(" ", ""))
+
+    def build_pendot_instances(self):
+        # Transform every instance in a single pendot process, so the
+        # source is only parsed and decomposed once. The manifest is the
+        # target of this step; the per-instance builds depend on it.
+        source = self.sources[0].path
+        prefix = self.sources[0].family_name.replace(" ", "")
+        jobs = self.config.get("pendotJobs", os.cpu_count() or 1)
+        self.recipe[self.pendot_manifest] = [
+            {"source": source},
+            {
+                "operation": "exec",
+                "exe": "pendot",
+                "args": f'batch --instances all --output-dir build --prefix "{prefix}" '
+                f"--jobs {jobs} --manifest {self.pendot_manifest} {source}",
+            },
+        ]
+
     def build_a_static(self, instance):
         source = self.sources[0].path
         family_name = self.sources[0].family_name
@@ -30,18 +53,12 @@ class Pendot(GFBuilder):
         outdir = self.config["ttDir"]
         target = os.path.join(outdir, f"{filename}.ttf")
 
-        self.recipe[target] = [
-            {"source": self.sources[0].path},
-            {
-                "operation": "exec",
-                "exe": "pendot",
-                "args": f'-o {new_glyphs_file} {source} "{instance.name}"',
-            },
-            {"source": new_glyphs_file},
-        ]
         # Do guidelines here...
         ufo_target = str(self.instance_dir / f"{filename}.ufo")
-        self.recipe[target] += [
+        # The glyphs file is written by the shared pendot step, so we
+        # start from the original source and depend on its manifest.
+        self.recipe[target] = [
+            {"source": source},
             # Manual reimplementation of instantiateUfo operation
             # because the source doesn't exist yet. We do this rather
             # than compiling the glyphs file directly because it allows us
@@ -50,6 +67,7 @@ class Pendot(GFBuilder):
                 "operation": "exec",
                 "exe": "fontmake",
                 "args": f'-i "{family_name} {instance.name}" -o ufo -g {new_glyphs_file} --output-path {ufo_target}',
+                "needs": [self.pendot_manifest],
             },
             {
                 "source": ufo_target,
@@ -1,4 +1,6 @@
+import gc
 import math
+from contextlib import contextmanager
 from typing import Optional, Union
 import copy
 from fontTools.misc.transform import Identity, Transform
@@ -28,6 +30,19 @@ TuplePoint = tuple[float, float]
 TupleSegment = list[TuplePoint]
 
 
+@contextmanager
+def gc_paused():
+    # Building glyphsLib objects creates many objects, none of them garbage,
+    # so the cyclic collector's repeated scans are wasted work.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 def distance(a: TuplePoint, b: TuplePoint) -> float:
     return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2)
 
@@ -45,40 +60,16 @@ def seg_to_kurbo(seg: Segment) -> TupleSegment:
 
     if type(seg).__name__ == "GSPathSegment":
         seg = seg.segmentStruct()[0][0 : seg.countOfPoints()]
-    seg = [kurbopy.Point(pt.x, pt.y) for pt in seg]
+    if isinstance(seg[0], tuple):
+        seg = [kurbopy.Point(x, y) for x, y in seg]
+    else:
+        seg = [kurbopy.Point(pt.x, pt.y) for pt in seg]
     if len(seg) == 4:
         return kurbopy.CubicBez(*seg)
     else:
         return kurbopy.Line(*seg)
 
 
-def path_to_kurbo(path: GSPath):
-    import kurbopy
-
-    bezpath = kurbopy.BezPath()
-
-    for ix, seg in enumerate(path.segments):
-        if type(seg).__name__ == "GSPathSegment":
-            seg = seg.segmentStruct()[0][0 : seg.countOfPoints()]
-        if ix == 0:
-            bezpath.move_to(kurbopy.Point(seg[0].x, seg[0].y))
-        if len(seg) == 4:
-            bezpath.curve_to(
-                kurbopy.Point(seg[1].x, seg[1].y),
-                kurbopy.Point(seg[2].x, seg[2].y),
-                kurbopy.Point(seg[3].x, seg[3].y),
-            )
-        else:
-            bezpath.line_to(kurbopy.Point(seg[1].x, seg[1].y))
-    if path.closed:
-        bezpath.close_path()
-    return bezpath
-
-
-def kurbo_bounds_intersect(b1: "Rect", b2: "Rect") -> bool:
-    return b1.intersect(b2).size().max_side() > 0
-
-
 def arclength(seg: Union[Segment, TupleSegment], approx=False) -> float:
     # For GSSegments, we could just return seg.length() here, but we want to
     # ensure that the same algorithm is used in both Glyphs and
@@ -93,10 +84,6 @@ def arclength(seg: Union[Segment, TupleSegment], approx=False) -> float:
     return calcCubicArcLength(*seg)
 
 
-def pathLength(path: GSPath) -> float:
-    return sum(arclength(seg) for seg in path.segments)
-
-
 def decomposedPaths(layer: GSLayer, ctm: Optional[Transform] = None) -> list[GSPath]:
     if hasattr(layer, "copyDecomposedLayer"):
         return layer.copyDecomposedLayer().paths
@@ -164,9 +151,9 @@ def makeRect(myBottomLeft, myTopRight):
         [myBottomLeft[0], myTopRight[1]],
     ]
 
-    for thisPoint in myCoordinates:
-        newNode = GSNode((thisPoint[0], thisPoint[1]), GSLINE)
-        myRect.nodes.append(newNode)
+    myRect.nodes = [
+        GSNode((thisPoint[0], thisPoint[1]), GSLINE) for thisPoint in myCoordinates
+    ]
 
     myRect.closed = True
     return myRect